@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Backfill the sparse-index attributes on notifications written before those
+indexes existed. Items without the attribute never appear in the index, so
+the Lambda that reads it would skip them forever.
+
+- pending_delivery_at (UndeliveredIndex): set to created_at on notifications
+  that have no delivered_at.
+- pending_summary_key (UnsummarizedIndex): set to "<source_id>#<created_at>"
+  on notifications that have no summary.
+- With --sync-state-table, also seeds the GLOBAL/STATS counters that
+  status-check reads (total_notifications, notifications_sent) from a count
+  of the existing notifications.
+
+Safe to re-run: only items still missing the attribute are updated, and each
+update is conditional so it never touches an item summarized or delivered in the
+meantime.
+
+Usage:
+    python3 backfill-notification-indexes.py --table notification-agent-notifications-prod
+"""
+
+import argparse
+from datetime import datetime
+from typing import Optional, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+
+def _scan(table, filter_expression: str):
+    """Yield every item matching filter_expression, following pagination."""
+    scan_kwargs = {'FilterExpression': filter_expression}
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _update(table, item, **update_kwargs) -> bool:
+    """Conditionally update one item; False if the condition no longer holds."""
+    try:
+        table.update_item(
+            Key={'user_id': item['user_id'], 'notification_id': item['notification_id']},
+            **update_kwargs
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+
+def backfill_pending_delivery(table) -> int:
+    """Give undelivered notifications a pending_delivery_at so UndeliveredIndex lists them."""
+    now = datetime.utcnow().isoformat() + 'Z'
+    updated = 0
+    for item in _scan(table, 'attribute_not_exists(delivered_at) AND attribute_not_exists(pending_delivery_at)'):
+        updated += _update(
+            table, item,
+            UpdateExpression='SET pending_delivery_at = if_not_exists(created_at, :now)',
+            ConditionExpression='attribute_not_exists(delivered_at) AND attribute_not_exists(pending_delivery_at)',
+            ExpressionAttributeValues={':now': now}
+        )
+    return updated
+
+
+def backfill_pending_summary(table) -> int:
+    """Give unsummarized notifications a pending_summary_key so UnsummarizedIndex lists them."""
+    now = datetime.utcnow().isoformat() + 'Z'
+    updated = 0
+    for item in _scan(table, 'attribute_not_exists(summary) AND attribute_not_exists(pending_summary_key)'):
+        # Same format process-notifications writes; the key can't be built inside an UpdateExpression
+        pending_summary_key = f"{item.get('source_id', '')}#{item.get('created_at') or now}"
+        updated += _update(
+            table, item,
+            UpdateExpression='SET pending_summary_key = :key',
+            ConditionExpression='attribute_not_exists(summary) AND attribute_not_exists(pending_summary_key)',
+            ExpressionAttributeValues={':key': pending_summary_key}
+        )
+    return updated
+
+
+def _count(table, filter_expression: Optional[str] = None) -> int:
+    """Count items with a Select=COUNT scan, following pagination."""
+    scan_kwargs = {'Select': 'COUNT'}
+    if filter_expression:
+        scan_kwargs['FilterExpression'] = filter_expression
+    total = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        total += response.get('Count', 0)
+        if 'LastEvaluatedKey' not in response:
+            return total
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def seed_stats_counters(table, sync_state_table) -> Tuple[int, int]:
+    """Set the status-check counters to the current notification counts."""
+    total = _count(table)
+    sent = _count(table, 'attribute_exists(delivered_at)')
+    sync_state_table.update_item(
+        Key={'user_id': 'GLOBAL', 'source_id': 'STATS'},
+        UpdateExpression='SET total_notifications = :total, notifications_sent = :sent',
+        ExpressionAttributeValues={':total': total, ':sent': sent}
+    )
+    return total, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--table', required=True, help='Notifications table name')
+    parser.add_argument('--sync-state-table', default=None, help='Sync state table name (seeds the stats counters)')
+    parser.add_argument('--region', default=None, help='AWS region (default: from the environment)')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+    table = dynamodb.Table(args.table)
+    print(f"pending_delivery_at: backfilled {backfill_pending_delivery(table)} notification(s)")
+    print(f"pending_summary_key: backfilled {backfill_pending_summary(table)} notification(s)")
+    if args.sync_state_table:
+        total, sent = seed_stats_counters(table, dynamodb.Table(args.sync_state_table))
+        print(f"stats counters: total_notifications={total}, notifications_sent={sent}")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,7 @@ echo "Building Lambda deployment packages..."
 # Function to build a Lambda package
 build_lambda() {
     local function_name=$1
+    local architecture=${2:-x86_64}  # Must match the function's architectures in lambda.tf
     local function_dir="$LAMBDA_DIR/$function_name"
     local zip_file="$TERRAFORM_DIR/../lambda-functions/$function_name/deployment.zip"
     
@@ -33,7 +34,14 @@ build_lambda() {
     # Install dependencies
     if [ -f "$function_dir/requirements.txt" ]; then
         echo "Installing dependencies for $function_name..."
-        pip install -r "$function_dir/requirements.txt" -t "$temp_dir/" --quiet
+        if [ "$architecture" = "arm64" ]; then
+            # Fetch aarch64 wheels so C extensions (e.g. orjson) run on Graviton
+            pip install -r "$function_dir/requirements.txt" -t "$temp_dir/" --quiet \
+                --platform manylinux2014_aarch64 --implementation cp --python-version 3.11 \
+                --only-binary=:all:
+        else
+            pip install -r "$function_dir/requirements.txt" -t "$temp_dir/" --quiet
+        fi
     fi
     
     # Create zip file
@@ -45,10 +53,10 @@ build_lambda() {
 
 # Build all Lambda functions
 build_lambda "user-management"
-build_lambda "data-source-config"
+build_lambda "data-source-config" arm64
 build_lambda "process-notifications"
 build_lambda "summarize"
-build_lambda "deliver"
+build_lambda "deliver" arm64
 build_lambda "status-check"
 
 echo ""
@@ -29,6 +29,19 @@ resource "aws_dynamodb_table" "data_sources" {
     type = "S"
   }
 
+  attribute {
+    name = "status"
+    type = "S"
+  }
+
+  # Lets process-notifications Query active sources instead of Scan + filter
+  global_secondary_index {
+    name               = "status-index"
+    hash_key           = "status"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["source_type", "email", "credentials_secret_arn", "host", "port", "use_ssl"]
+  }
+
   tags = local.common_tags
 }
 
@@ -48,6 +61,34 @@ resource "aws_dynamodb_table" "notifications" {
     type = "S"
   }
 
+  attribute {
+    name = "pending_delivery_at"
+    type = "S"
+  }
+
+  attribute {
+    name = "pending_summary_key"
+    type = "S"
+  }
+
+  # Sparse index: only notifications that still have pending_delivery_at
+  # (i.e. not yet delivered) appear here
+  global_secondary_index {
+    name            = "UndeliveredIndex"
+    hash_key        = "user_id"
+    range_key       = "pending_delivery_at"
+    projection_type = "ALL"
+  }
+
+  # Sparse index: only notifications without a summary; the "<source_id>#<created_at>"
+  # sort key lets summarize select one source with begins_with instead of a filter
+  global_secondary_index {
+    name            = "UnsummarizedIndex"
+    hash_key        = "user_id"
+    range_key       = "pending_summary_key"
+    projection_type = "ALL"
+  }
+
   tags = local.common_tags
 }
 
@@ -20,6 +20,13 @@ resource "aws_iam_role" "lambda_execution" {
   tags = local.common_tags
 }
 
+# ENI management for Lambdas attached to a VPC
+resource "aws_iam_role_policy_attachment" "lambda_vpc_access" {
+  count      = local.use_vpc ? 1 : 0
+  role       = aws_iam_role.lambda_execution.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole"
+}
+
 # IAM Policy for Lambda functions
 resource "aws_iam_role_policy" "lambda_execution" {
   name = "${local.app_name}-lambda-execution-${local.environment}"
@@ -45,7 +52,9 @@ resource "aws_iam_role_policy" "lambda_execution" {
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
           "dynamodb:Query",
-          "dynamodb:Scan"
+          "dynamodb:Scan",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:BatchGetItem"
         ]
         Resource = [
           aws_dynamodb_table.users.arn,
@@ -85,7 +94,16 @@ resource "aws_iam_role_policy" "lambda_execution" {
         Effect = "Allow"
         Action = [
           "ses:SendEmail",
-          "ses:SendRawEmail"
+          "ses:SendRawEmail",
+          "ses:SendBulkTemplatedEmail"
+        ]
+        Resource = "*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "xray:PutTraceSegments",
+          "xray:PutTelemetryRecords"
         ]
         Resource = "*"
       }
@@ -106,6 +124,7 @@ resource "aws_lambda_function" "user_management" {
     variables = {
       DYNAMODB_TABLE_USERS = aws_dynamodb_table.users.name
       JWT_SECRET          = var.jwt_secret
+      BCRYPT_ROUNDS       = var.bcrypt_rounds
     }
   }
 
@@ -119,6 +138,7 @@ resource "aws_lambda_function" "data_source_config" {
   role            = aws_iam_role.lambda_execution.arn
   handler         = "handler.lambda_handler"
   runtime         = "python3.11"
+  architectures    = ["arm64"]  # Graviton: better price/performance for IO-bound handlers
   timeout         = 60
 
   environment {
@@ -128,6 +148,18 @@ resource "aws_lambda_function" "data_source_config" {
     }
   }
 
+  dynamic "vpc_config" {
+    for_each = local.use_vpc ? [1] : []
+    content {
+      subnet_ids         = var.vpc_subnet_ids
+      security_group_ids = [aws_security_group.lambda[0].id]
+    }
+  }
+
+  tracing_config {
+    mode = "Active"
+  }
+
   tags = local.common_tags
 }
 
@@ -149,6 +181,14 @@ resource "aws_lambda_function" "process_notifications" {
     }
   }
 
+  dynamic "vpc_config" {
+    for_each = local.use_vpc ? [1] : []
+    content {
+      subnet_ids         = var.vpc_subnet_ids
+      security_group_ids = [aws_security_group.lambda[0].id]
+    }
+  }
+
   tags = local.common_tags
 }
 
@@ -181,23 +221,37 @@ resource "aws_lambda_function" "deliver" {
   role            = aws_iam_role.lambda_execution.arn
   handler         = "handler.lambda_handler"
   runtime         = "python3.11"
+  architectures    = ["arm64"]  # Graviton: better price/performance for IO-bound handlers
   timeout         = 30
 
   environment {
     variables = {
       DYNAMODB_TABLE_USERS        = aws_dynamodb_table.users.name
       DYNAMODB_TABLE_NOTIFICATIONS = aws_dynamodb_table.notifications.name
+      DYNAMODB_TABLE_SYNC_STATE    = aws_dynamodb_table.sync_state.name
       SES_FROM_EMAIL               = var.ses_from_email
       TWILIO_ACCOUNT_SID           = var.twilio_account_sid
       TWILIO_AUTH_TOKEN            = var.twilio_auth_token
       TWILIO_FROM_NUMBER           = var.twilio_from_number
+      SES_SUMMARY_TEMPLATE         = aws_ses_template.notification_summary.name
       AWS_REGION                   = var.aws_region
     }
   }
 
+  tracing_config {
+    mode = "Active"
+  }
+
   tags = local.common_tags
 }
 
+# SES template used for batched summary emails
+resource "aws_ses_template" "notification_summary" {
+  name    = "${local.app_name}-notification-summary-${local.environment}"
+  subject = "Notification Summary ({{count}} new items)"
+  text    = "You have {{count}} new notification(s):\n\n{{{summary}}}"
+}
+
 # Lambda function: status-check
 resource "aws_lambda_function" "status_check" {
   filename         = "${path.module}/../lambda-functions/status-check/deployment.zip"
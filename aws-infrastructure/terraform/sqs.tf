@@ -29,5 +29,6 @@ resource "aws_lambda_event_source_mapping" "delivery_queue" {
   function_name    = aws_lambda_function.deliver.arn
   batch_size       = 10
   maximum_batching_window_in_seconds = 5
+  function_response_types = ["ReportBatchItemFailures"]  # Only retry records the handler reports as failed
 }
 
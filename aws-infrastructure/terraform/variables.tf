@@ -85,6 +85,12 @@ variable "jwt_secret" {
   sensitive   = true
 }
 
+variable "bcrypt_rounds" {
+  description = "bcrypt cost factor for new password hashes (each step down halves login/signup CPU)"
+  type        = number
+  default     = 12
+}
+
 variable "notification_frequency_minutes" {
   description = "Notification processing frequency in minutes"
   type        = number
@@ -97,3 +103,21 @@ variable "use_parameter_store" {
   default     = true
 }
 
+
+variable "vpc_id" {
+  description = "VPC to attach the IMAP-facing Lambdas (process-notifications, data-source-config) to (optional; the subnets need a NAT gateway route for IMAP)"
+  type        = string
+  default     = ""
+}
+
+variable "vpc_subnet_ids" {
+  description = "Private subnet IDs for Lambdas and interface endpoints, routed through a NAT gateway (required when vpc_id is set)"
+  type        = list(string)
+  default     = []
+}
+
+variable "vpc_route_table_ids" {
+  description = "Private route table IDs for the DynamoDB gateway endpoint (required when vpc_id is set)"
+  type        = list(string)
+  default     = []
+}
@@ -0,0 +1,66 @@
+# VPC endpoints (only created when the Lambdas run inside a VPC)
+# Only the IMAP-facing Lambdas (process-notifications, data-source-config) are
+# attached. IMAP servers are on the public internet, so the private subnets'
+# route tables MUST have a NAT gateway route; it is not provisioned here.
+# deliver stays outside the VPC because it calls Twilio over the internet.
+# The endpoints keep DynamoDB, Secrets Manager and SQS traffic off the NAT gateway.
+
+locals {
+  use_vpc = var.vpc_id != ""
+}
+
+resource "aws_security_group" "lambda" {
+  count       = local.use_vpc ? 1 : 0
+  name        = "${local.app_name}-lambda-${local.environment}"
+  description = "Notification Agent Lambdas"
+  vpc_id      = var.vpc_id
+
+  egress {
+    from_port   = 0
+    to_port     = 0
+    protocol    = "-1"
+    cidr_blocks = ["0.0.0.0/0"]
+  }
+
+  tags = local.common_tags
+}
+
+resource "aws_security_group" "vpc_endpoints" {
+  count       = local.use_vpc ? 1 : 0
+  name        = "${local.app_name}-vpc-endpoints-${local.environment}"
+  description = "HTTPS from Notification Agent Lambdas to interface endpoints"
+  vpc_id      = var.vpc_id
+
+  ingress {
+    from_port       = 443
+    to_port         = 443
+    protocol        = "tcp"
+    security_groups = [aws_security_group.lambda[0].id]
+  }
+
+  tags = local.common_tags
+}
+
+# Gateway endpoint: DynamoDB
+resource "aws_vpc_endpoint" "dynamodb" {
+  count             = local.use_vpc ? 1 : 0
+  vpc_id            = var.vpc_id
+  service_name      = "com.amazonaws.${var.aws_region}.dynamodb"
+  vpc_endpoint_type = "Gateway"
+  route_table_ids   = var.vpc_route_table_ids
+
+  tags = local.common_tags
+}
+
+# Interface endpoints: Secrets Manager and SQS (process-notifications queues summaries)
+resource "aws_vpc_endpoint" "interface" {
+  for_each            = local.use_vpc ? toset(["secretsmanager", "sqs"]) : toset([])
+  vpc_id              = var.vpc_id
+  service_name        = "com.amazonaws.${var.aws_region}.${each.key}"
+  vpc_endpoint_type   = "Interface"
+  subnet_ids          = var.vpc_subnet_ids
+  security_group_ids  = [aws_security_group.vpc_endpoints[0].id]
+  private_dns_enabled = true
+
+  tags = local.common_tags
+}
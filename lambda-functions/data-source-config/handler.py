@@ -1,13 +1,17 @@
 """
 Lambda function for data source configuration (add, update, delete email accounts).
+
+Deployed on arm64 (Graviton); C-extension dependencies must be built for aarch64
+(see aws-infrastructure/scripts/build-lambda-packages.sh).
 """
 
+import imaplib
 import json
 import os
 import logging
 import uuid
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import boto3
 from botocore.exceptions import ClientError
 from botocore.client import Config
@@ -16,10 +20,83 @@ from botocore.client import Config
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sources_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_DATA_SOURCES', 'data_sources'))
-secrets_manager = boto3.client('secretsmanager', config=Config(region_name=os.environ.get('AWS_REGION', 'us-east-1')))
+# Trace AWS SDK and HTTP calls with X-Ray when running under an active tracing config
+if os.environ.get('AWS_XRAY_DAEMON_ADDRESS'):
+    try:
+        from aws_xray_sdk.core import patch_all
+        patch_all()
+    except ImportError:
+        logger.warning("aws-xray-sdk not installed; X-Ray subsegments disabled")
+
+# Prefer orjson (C extension) for JSON encoding/decoding; fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Initialize AWS clients (module scope so warm invocations reuse the keep-alive connections)
+_boto_config = Config(
+    tcp_keepalive=True,
+    connect_timeout=1.0,  # AWS endpoints are in-region; fail fast and let retries take over
+    read_timeout=5.0,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    max_pool_connections=10
+)
+DYNAMODB_TABLE_DATA_SOURCES = os.environ.get('DYNAMODB_TABLE_DATA_SOURCES', 'data_sources')
+dynamodb = boto3.resource('dynamodb', config=_boto_config)
+sources_table = dynamodb.Table(DYNAMODB_TABLE_DATA_SOURCES)
+# Low-level client for hot read paths (skips the resource layer's type marshalling)
+dynamodb_client = boto3.client('dynamodb', config=_boto_config)
+secrets_manager = boto3.client(
+    'secretsmanager',
+    config=_boto_config.merge(Config(region_name=os.environ.get('AWS_REGION', 'us-east-1')))
+)
+
+# CORS headers shared by every response
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
+# Socket timeout for the IMAP connection test
+IMAP_TEST_TIMEOUT_SECONDS = 5
+
+# Known IMAP hosts by email domain; other domains fall back to imap.<domain>
+IMAP_HOSTS = {
+    'gmail.com': 'imap.gmail.com',
+    'outlook.com': 'imap-mail.outlook.com',
+    'hotmail.com': 'imap-mail.outlook.com',
+    'yahoo.com': 'imap.mail.yahoo.com'
+}
+
+
+def _from_attribute_value(value: Dict[str, Any]) -> Any:
+    """Convert a low-level DynamoDB AttributeValue for the scalar types we store."""
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        number = value['N']
+        return int(number) if number.lstrip('-').isdigit() else float(number)
+    if 'BOOL' in value:
+        return value['BOOL']
+    return None  # NULL (and types this table does not use)
+
+
+def _response(status_code: int, body: Any) -> Dict[str, Any]:
+    """Build an API Gateway response; non-string bodies are JSON-encoded."""
+    return {
+        'statusCode': status_code,
+        'headers': CORS_HEADERS,
+        'body': body if isinstance(body, str) else _json_dumps(body)
+    }
+
 
 # Get user from token (shared utility)
 def get_user_from_token(headers: Dict[str, str]) -> Dict[str, Any]:
@@ -38,12 +115,20 @@ def get_user_from_token(headers: Dict[str, str]) -> Dict[str, Any]:
     return {'user_id': 'temp_user'}  # Placeholder
 
 
-def encrypt_credentials(password: str, user_id: str) -> str:
+def get_secret_name(user_id: str, source_id: str) -> str:
+    """
+    Deterministic Secrets Manager name for a data source's credentials.
+    Sources store the secret's ARN (credentials_secret_arn), not this name.
+    """
+    return f"notification-agent/{user_id}/{source_id}"
+
+
+def encrypt_credentials(password: str, user_id: str, source_id: Optional[str] = None) -> str:
     """
     Store credentials in AWS Secrets Manager.
     Returns the secret ARN.
     """
-    secret_name = f"notification-agent/{user_id}/{uuid.uuid4()}"
+    secret_name = get_secret_name(user_id, source_id or str(uuid.uuid4()))
     
     try:
         response = secrets_manager.create_secret(
@@ -83,103 +168,79 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         path = event.get('path', '')
         path_parameters = event.get('pathParameters') or {}
         headers = event.get('headers', {})
-        body = json.loads(event.get('body', '{}') or '{}')
-        
-        # CORS headers
-        cors_headers = {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-        }
+        body = _json_loads(event.get('body', '{}') or '{}')
         
         # Handle OPTIONS request
         if http_method == 'OPTIONS':
-            return {
-                'statusCode': 200,
-                'headers': cors_headers,
-                'body': ''
-            }
+            return _response(200, '')
         
         # Get user from token
         user = get_user_from_token(headers)
         if not user:
-            return {
-                'statusCode': 401,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Unauthorized'})
-            }
+            return _response(401, {'message': 'Unauthorized'})
         
         user_id = user['user_id']
         
         # Route requests
         if path == '/data-sources' and http_method == 'GET':
-            return handle_list_sources(user_id, cors_headers)
+            return handle_list_sources(user_id)
         elif path == '/data-sources' and http_method == 'POST':
-            return handle_add_source(user_id, body, cors_headers)
+            return handle_add_source(user_id, body)
         elif path.startswith('/data-sources/') and http_method == 'PUT':
             source_id = path_parameters.get('id') or path.split('/')[-1]
-            return handle_update_source(user_id, source_id, body, cors_headers)
+            return handle_update_source(user_id, source_id, body)
         elif path.startswith('/data-sources/') and http_method == 'DELETE':
             source_id = path_parameters.get('id') or path.split('/')[-1]
-            return handle_delete_source(user_id, source_id, cors_headers)
+            return handle_delete_source(user_id, source_id)
         elif path.endswith('/test') and http_method == 'POST':
             source_id = path_parameters.get('id') or path.split('/')[-2]
-            return handle_test_source(user_id, source_id, cors_headers)
+            return handle_test_source(user_id, source_id)
         else:
-            return {
-                'statusCode': 404,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Not found'})
-            }
+            return _response(404, {'message': 'Not found'})
             
     except Exception as e:
         logger.error(f"Error in data-source-config: {str(e)}", exc_info=True)
-        return {
-            'statusCode': 500,
-            'headers': cors_headers if 'cors_headers' in locals() else {},
-            'body': json.dumps({'message': 'Internal server error'})
-        }
+        return _response(500, {'message': 'Internal server error'})
 
 
-def handle_list_sources(user_id: str, cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_list_sources(user_id: str) -> Dict[str, Any]:
     """List all data sources for user."""
     try:
-        response = sources_table.query(
+        paginator = dynamodb_client.get_paginator('query')
+        pages = paginator.paginate(
+            TableName=DYNAMODB_TABLE_DATA_SOURCES,
             KeyConditionExpression='user_id = :user_id',
-            ExpressionAttributeValues={':user_id': user_id}
+            # Only fetch the fields returned to the client (never credentials_secret_arn)
+            ProjectionExpression='source_id, source_type, email, host, port, use_ssl, #st, last_sync_at, created_at',
+            ExpressionAttributeNames={'#st': 'status'},  # status is a reserved word
+            ExpressionAttributeValues={':user_id': {'S': user_id}}
         )
         
         sources = []
-        for item in response.get('Items', []):
-            # Don't return password/credentials in list
-            source = {
-                'source_id': item['source_id'],
-                'source_type': item.get('source_type', 'email'),
-                'email': item.get('email'),
-                'host': item.get('host'),
-                'port': item.get('port', 993),
-                'use_ssl': item.get('use_ssl', True),
-                'status': item.get('status', 'active'),
-                'last_sync_at': item.get('last_sync_at'),
-                'created_at': item.get('created_at')
-            }
-            sources.append(source)
-        
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps(sources)
-        }
+        for page in pages:
+            for raw_item in page.get('Items', []):
+                item = {key: _from_attribute_value(value) for key, value in raw_item.items()}
+                # Don't return password/credentials in list
+                source = {
+                    'source_id': item['source_id'],
+                    'source_type': item.get('source_type', 'email'),
+                    'email': item.get('email'),
+                    'host': item.get('host'),
+                    'port': item.get('port', 993),
+                    'use_ssl': item.get('use_ssl', True),
+                    'status': item.get('status', 'active'),
+                    'last_sync_at': item.get('last_sync_at'),
+                    'created_at': item.get('created_at')
+                }
+                sources.append(source)
+        
+        return _response(200, sources)
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+        return _response(500, {'message': 'Database error'})
 
 
-def handle_add_source(user_id: str, body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_add_source(user_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
     """Add new data source."""
     source_type = body.get('source_type', 'email')
     email = body.get('email', '').lower().strip()
@@ -189,41 +250,26 @@ def handle_add_source(user_id: str, body: Dict[str, Any], cors_headers: Dict[str
     use_ssl = body.get('use_ssl', True)
     
     if not email or not password:
-        return {
-            'statusCode': 400,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Email and password are required'})
-        }
+        return _response(400, {'message': 'Email and password are required'})
     
     # Auto-detect IMAP host if not provided
     if not host:
-        if '@gmail.com' in email:
-            host = 'imap.gmail.com'
-        elif '@outlook.com' in email or '@hotmail.com' in email:
-            host = 'imap-mail.outlook.com'
-        elif '@yahoo.com' in email:
-            host = 'imap.mail.yahoo.com'
-        else:
-            # Try to extract domain
-            domain = email.split('@')[1] if '@' in email else ''
-            host = f'imap.{domain}' if domain else 'imap.gmail.com'
+        domain = email.rpartition('@')[2] if '@' in email else ''
+        host = IMAP_HOSTS.get(domain) or (f'imap.{domain}' if domain else 'imap.gmail.com')
     
     # Generate source ID
     source_id = str(uuid.uuid4())
     
-    # Store password in Secrets Manager
+    # Store source configuration
+    now = datetime.utcnow().isoformat() + 'Z'
+    
+    # Store password in Secrets Manager first, so an active source never
+    # points at a secret that does not exist yet
     try:
-        secret_arn = encrypt_credentials(password, user_id)
+        secret_arn = encrypt_credentials(password, user_id, source_id)
     except Exception as e:
         logger.error(f"Error storing credentials: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Failed to store credentials'})
-        }
-    
-    # Store source configuration
-    now = datetime.utcnow().isoformat() + 'Z'
+        return _response(500, {'message': 'Failed to store credentials'})
     
     source_item = {
         'user_id': user_id,
@@ -242,54 +288,42 @@ def handle_add_source(user_id: str, body: Dict[str, Any], cors_headers: Dict[str
     
     try:
         sources_table.put_item(Item=source_item)
-        
-        # Return source (without password)
-        source_response = {
-            'source_id': source_id,
-            'source_type': source_type,
-            'email': email,
-            'host': host,
-            'port': port,
-            'use_ssl': use_ssl,
-            'status': 'active',
-            'created_at': now
-        }
-        
-        return {
-            'statusCode': 201,
-            'headers': cors_headers,
-            'body': json.dumps(source_response)
-        }
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Failed to create data source'})
-        }
+        # Don't leave an orphaned secret behind
+        try:
+            secrets_manager.delete_secret(SecretId=secret_arn, ForceDeleteWithoutRecovery=True)
+        except ClientError as e:
+            logger.warning(f"Error deleting secret: {e}")
+        return _response(500, {'message': 'Failed to create data source'})
+    
+    # Return source (without password)
+    source_response = {
+        'source_id': source_id,
+        'source_type': source_type,
+        'email': email,
+        'host': host,
+        'port': port,
+        'use_ssl': use_ssl,
+        'status': 'active',
+        'created_at': now
+    }
+    
+    return _response(201, source_response)
 
 
-def handle_update_source(user_id: str, source_id: str, body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_update_source(user_id: str, source_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
     """Update data source."""
     try:
-        # Get existing source
-        response = sources_table.get_item(
-            Key={'user_id': user_id, 'source_id': source_id}
-        )
-        
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Data source not found'})
-            }
-        
         # Build update expression
         update_expression_parts = []
+        expression_attribute_names = {}
         expression_attribute_values = {}
         
         if 'status' in body:
-            update_expression_parts.append('status = :status')
+            # status is a DynamoDB reserved word and must be aliased
+            update_expression_parts.append('#status = :status')
+            expression_attribute_names['#status'] = 'status'
             expression_attribute_values[':status'] = body['status']
         
         if 'host' in body:
@@ -305,9 +339,17 @@ def handle_update_source(user_id: str, source_id: str, body: Dict[str, Any], cor
             expression_attribute_values[':use_ssl'] = body['use_ssl']
         
         if 'password' in body:
+            # Only the password path needs the existing item (for its secret ARN)
+            response = sources_table.get_item(
+                Key={'user_id': user_id, 'source_id': source_id},
+                ProjectionExpression='credentials_secret_arn'
+            )
+            
+            if 'Item' not in response:
+                return _response(404, {'message': 'Data source not found'})
+            
             # Update password in Secrets Manager
-            existing_item = response['Item']
-            old_secret_arn = existing_item.get('credentials_secret_arn')
+            old_secret_arn = response['Item'].get('credentials_secret_arn')
             
             if old_secret_arn:
                 # Update existing secret
@@ -317,34 +359,38 @@ def handle_update_source(user_id: str, source_id: str, body: Dict[str, Any], cor
                 )
             else:
                 # Create new secret
-                secret_arn = encrypt_credentials(body['password'], user_id)
+                secret_arn = encrypt_credentials(body['password'], user_id, source_id)
                 update_expression_parts.append('credentials_secret_arn = :secret_arn')
                 expression_attribute_values[':secret_arn'] = secret_arn
         
         if not update_expression_parts:
-            return {
-                'statusCode': 400,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'No fields to update'})
-            }
+            return _response(400, {'message': 'No fields to update'})
         
         update_expression_parts.append('updated_at = :updated_at')
         expression_attribute_values[':updated_at'] = datetime.utcnow().isoformat() + 'Z'
         
         update_expression = 'SET ' + ', '.join(update_expression_parts)
         
-        sources_table.update_item(
-            Key={'user_id': user_id, 'source_id': source_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeValues=expression_attribute_values,
-            ReturnValues='ALL_NEW'
-        )
+        # Single round-trip: the condition replaces the existence check and
+        # ALL_NEW replaces the follow-up read
+        update_kwargs = {
+            'Key': {'user_id': user_id, 'source_id': source_id},
+            'UpdateExpression': update_expression,
+            'ConditionExpression': 'attribute_exists(source_id)',
+            'ExpressionAttributeValues': expression_attribute_values,
+            'ReturnValues': 'ALL_NEW'
+        }
+        if expression_attribute_names:
+            update_kwargs['ExpressionAttributeNames'] = expression_attribute_names
         
-        # Get updated source
-        response = sources_table.get_item(
-            Key={'user_id': user_id, 'source_id': source_id}
-        )
-        item = response['Item']
+        try:
+            update_response = sources_table.update_item(**update_kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return _response(404, {'message': 'Data source not found'})
+            raise
+        
+        item = update_response['Attributes']
         
         source_response = {
             'source_id': item['source_id'],
@@ -358,37 +404,29 @@ def handle_update_source(user_id: str, source_id: str, body: Dict[str, Any], cor
             'created_at': item.get('created_at')
         }
         
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps(source_response)
-        }
+        return _response(200, source_response)
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+        return _response(500, {'message': 'Database error'})
 
 
-def handle_delete_source(user_id: str, source_id: str, cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_delete_source(user_id: str, source_id: str) -> Dict[str, Any]:
     """Delete data source."""
     try:
-        # Get source to delete secret
-        response = sources_table.get_item(
-            Key={'user_id': user_id, 'source_id': source_id}
-        )
-        
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Data source not found'})
-            }
+        # Delete from DynamoDB, returning the old item so we know which secret to remove
+        try:
+            response = sources_table.delete_item(
+                Key={'user_id': user_id, 'source_id': source_id},
+                ConditionExpression='attribute_exists(source_id)',
+                ReturnValues='ALL_OLD'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return _response(404, {'message': 'Data source not found'})
+            raise
         
         # Delete secret from Secrets Manager
-        secret_arn = response['Item'].get('credentials_secret_arn')
+        secret_arn = response.get('Attributes', {}).get('credentials_secret_arn')
         if secret_arn:
             try:
                 secrets_manager.delete_secret(
@@ -398,26 +436,13 @@ def handle_delete_source(user_id: str, source_id: str, cors_headers: Dict[str, s
             except ClientError as e:
                 logger.warning(f"Error deleting secret: {e}")
         
-        # Delete from DynamoDB
-        sources_table.delete_item(
-            Key={'user_id': user_id, 'source_id': source_id}
-        )
-        
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Data source deleted'})
-        }
+        return _response(200, {'message': 'Data source deleted'})
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+        return _response(500, {'message': 'Database error'})
 
 
-def handle_test_source(user_id: str, source_id: str, cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_test_source(user_id: str, source_id: str) -> Dict[str, Any]:
     """Test data source connection."""
     try:
         # Get source
@@ -426,50 +451,32 @@ def handle_test_source(user_id: str, source_id: str, cors_headers: Dict[str, str
         )
         
         if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Data source not found'})
-            }
+            return _response(404, {'message': 'Data source not found'})
         
         source = response['Item']
         
         # Get credentials
         secret_arn = source.get('credentials_secret_arn')
         if not secret_arn:
-            return {
-                'statusCode': 400,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'No credentials found'})
-            }
+            return _response(400, {'message': 'No credentials found'})
         
         password = decrypt_credentials(secret_arn)
         
         # Test IMAP connection
         try:
-            import imaplib
-            
-            mail = imaplib.IMAP4_SSL(source.get('host'), source.get('port', 993)) if source.get('use_ssl', True) else imaplib.IMAP4(source.get('host'), source.get('port', 143))
+            # Bound connect/login so a hung server can't hold the Lambda until its timeout
+            if source.get('use_ssl', True):
+                mail = imaplib.IMAP4_SSL(source.get('host'), source.get('port', 993), timeout=IMAP_TEST_TIMEOUT_SECONDS)
+            else:
+                mail = imaplib.IMAP4(source.get('host'), source.get('port', 143), timeout=IMAP_TEST_TIMEOUT_SECONDS)
             mail.login(source.get('email'), password)
             mail.logout()
             
-            return {
-                'statusCode': 200,
-                'headers': cors_headers,
-                'body': json.dumps({'success': True, 'message': 'Connection successful'})
-            }
+            return _response(200, {'success': True, 'message': 'Connection successful'})
         except Exception as e:
             logger.error(f"IMAP connection error: {e}")
-            return {
-                'statusCode': 200,
-                'headers': cors_headers,
-                'body': json.dumps({'success': False, 'message': f'Connection failed: {str(e)}'})
-            }
+            return _response(200, {'success': False, 'message': f'Connection failed: {str(e)}'})
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+        return _response(500, {'message': 'Database error'})
 
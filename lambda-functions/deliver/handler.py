@@ -1,31 +1,110 @@
 """
 Lambda function to deliver notifications via SMS or Email.
 Triggered by SQS queue when summaries are ready.
+
+Deployed on arm64 (Graviton); C-extension dependencies must be built for aarch64
+(see aws-infrastructure/scripts/build-lambda-packages.sh).
 """
 
 import json
 import os
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import boto3
-from botocore.exceptions import ClientError
+import httpx
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+# Trace AWS SDK and HTTP calls with X-Ray when running under an active tracing config
+if os.environ.get('AWS_XRAY_DAEMON_ADDRESS'):
+    try:
+        from aws_xray_sdk.core import patch_all
+        patch_all()
+    except ImportError:
+        logger.warning("aws-xray-sdk not installed; X-Ray subsegments disabled")
+
+# Prefer orjson (C extension) for JSON encoding/decoding; fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Initialize AWS clients (module scope so warm invocations reuse the keep-alive connections)
+_boto_config = Config(
+    tcp_keepalive=True,
+    connect_timeout=1.0,  # AWS endpoints are in-region; fail fast and let retries take over
+    read_timeout=5.0,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    max_pool_connections=10
+)
+dynamodb = boto3.resource('dynamodb', config=_boto_config)
 users_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_USERS', 'users'))
 notifications_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_NOTIFICATIONS', 'notifications'))
-ses = boto3.client('ses', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+sync_state_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_SYNC_STATE', 'sync_state'))
+ses = boto3.client('ses', region_name=os.environ.get('AWS_REGION', 'us-east-1'), config=_boto_config)
 
 # Configuration
 SES_FROM_EMAIL = os.environ.get('SES_FROM_EMAIL', '')
 TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', '')
 TWILIO_FROM_NUMBER = os.environ.get('TWILIO_FROM_NUMBER', '')
+SES_SUMMARY_TEMPLATE = os.environ.get('SES_SUMMARY_TEMPLATE', 'notification-summary')
+SES_BULK_MAX_DESTINATIONS = 50  # SES limit per SendBulkTemplatedEmail call
+MAX_DELIVERY_WORKERS = 10  # SQS delivers at most 10 records per batch
+MAX_NOTIFICATIONS_PER_DELIVERY = 100
+UNDELIVERED_INDEX_NAME = 'UndeliveredIndex'
+MAX_STATUS_UPDATE_WORKERS = 8
+# Key of the sync_state item holding the notification counters read by status-check
+STATS_KEY = {'user_id': 'GLOBAL', 'source_id': 'STATS'}
+
+# Shared Twilio HTTP client so warm invocations reuse the TLS connection
+twilio_client = httpx.Client(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=5, keepalive_expiry=30),
+    auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+)
+
+# User items cached across warm invocations: user_id -> (fetched_at, item)
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_SIZE = 1024
+_user_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_user_cache_lock = threading.Lock()
+
+
+def get_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get a user item, served from the in-process cache while it is fresh."""
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+    if cached and now - cached[0] < USER_CACHE_TTL_SECONDS:
+        return cached[1]
+    
+    user_response = users_table.get_item(Key={'user_id': user_id})
+    user = user_response.get('Item')
+    if user is None:
+        return None
+    
+    with _user_cache_lock:
+        if len(_user_cache) >= USER_CACHE_MAX_SIZE and user_id not in _user_cache:
+            # Evict the oldest entry (dicts keep insertion order)
+            _user_cache.pop(next(iter(_user_cache)))
+        _user_cache[user_id] = (now, user)
+    return user
 
 
 def send_email_via_ses(to_email: str, subject: str, body: str) -> bool:
@@ -41,7 +120,7 @@ def send_email_via_ses(to_email: str, subject: str, body: str) -> bool:
         )
         logger.info(f"Email sent to {to_email}: {response['MessageId']}")
         return True
-    except ClientError as e:
+    except (ClientError, BotoCoreError) as e:  # BotoCoreError: timeouts, connection errors
         logger.error(f"Error sending email: {e}")
         return False
 
@@ -49,19 +128,15 @@ def send_email_via_ses(to_email: str, subject: str, body: str) -> bool:
 def send_sms_via_twilio(to_number: str, message: str) -> bool:
     """Send SMS via Twilio."""
     try:
-        import httpx
-        
         url = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
         
-        response = httpx.post(
+        response = twilio_client.post(
             url,
-            auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
             data={
                 'From': TWILIO_FROM_NUMBER,
                 'To': to_number,
                 'Body': message
-            },
-            timeout=30.0
+            }
         )
         
         if response.status_code == 201:
@@ -75,96 +150,265 @@ def send_sms_via_twilio(to_number: str, message: str) -> bool:
         return False
 
 
+def get_undelivered_notifications(user_id: str, notification_count: Any) -> List[Dict[str, Any]]:
+    """
+    Get up to notification_count undelivered notifications for a user.
+    
+    Reads the sparse UndeliveredIndex GSI, which only contains items that
+    still carry pending_delivery_at, so already-delivered history is never read.
+    The count comes from the SQS message, so it is clamped to
+    MAX_NOTIFICATIONS_PER_DELIVERY.
+    """
+    try:
+        max_items = max(1, min(int(notification_count or 10), MAX_NOTIFICATIONS_PER_DELIVERY))
+    except (TypeError, ValueError):
+        max_items = 10
+    
+    query_kwargs = {
+        'IndexName': UNDELIVERED_INDEX_NAME,
+        'KeyConditionExpression': 'user_id = :user_id',
+        'ExpressionAttributeValues': {':user_id': user_id},
+        'Limit': max_items
+    }
+    
+    notifications = []
+    while len(notifications) < max_items:
+        response = notifications_table.query(**query_kwargs)
+        notifications.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    return notifications[:max_items]
+
+
+def send_bulk_email_via_ses(deliveries: List[Dict[str, Any]]) -> List[Optional[bool]]:
+    """
+    Send summary emails with SendBulkTemplatedEmail, one destination per delivery.
+    Returns a per-delivery success flag in the same order as deliveries, or
+    None where SES returned no status (the email may or may not have gone out).
+    If a bulk call fails outright, that chunk falls back to individual sends.
+    """
+    results = []
+    for start in range(0, len(deliveries), SES_BULK_MAX_DESTINATIONS):
+        chunk = deliveries[start:start + SES_BULK_MAX_DESTINATIONS]
+        try:
+            response = ses.send_bulk_templated_email(
+                Source=SES_FROM_EMAIL,
+                Template=SES_SUMMARY_TEMPLATE,
+                DefaultTemplateData=_json_dumps({'count': 0, 'summary': ''}),
+                Destinations=[
+                    {
+                        'Destination': {'ToAddresses': [delivery['email']]},
+                        'ReplacementTemplateData': _json_dumps({
+                            'count': delivery['notification_count'],
+                            'summary': delivery['summary']
+                        })
+                    }
+                    for delivery in chunk
+                ]
+            )
+            statuses = response.get('Status', [])
+            if len(statuses) != len(chunk):
+                logger.error(f"SES returned {len(statuses)} statuses for {len(chunk)} destinations")
+            for index, delivery in enumerate(chunk):
+                status = statuses[index] if index < len(statuses) else None
+                if status is None:
+                    logger.error(f"No SES status for email to {delivery['email']}; delivery unknown")
+                    results.append(None)
+                elif status.get('Status') == 'Success':
+                    logger.info(f"Email sent to {delivery['email']}: {status.get('MessageId')}")
+                    results.append(True)
+                else:
+                    logger.error(f"Error sending email to {delivery['email']}: {status.get('Status')} - {status.get('Error')}")
+                    results.append(False)
+        except (ClientError, BotoCoreError) as e:
+            logger.warning(f"Bulk email send failed, falling back to individual sends: {e}")
+            results.extend(
+                send_email_via_ses(delivery['email'], delivery['subject'], delivery['message'])
+                for delivery in chunk
+            )
+    return results
+
+
+def _prepare_delivery(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Resolve the recipient and message for a single SQS record.
+    Returns None when there is nothing to deliver.
+    """
+    body = _json_loads(record['body'])
+    user_id = body.get('user_id')
+    summary = body.get('summary', '')
+    notification_count = body.get('notification_count', 0)
+    
+    if not user_id:
+        logger.warning("Missing user_id in SQS message")
+        return None
+    
+    # Get user preferences
+    user = get_user(user_id)
+    if user is None:
+        logger.warning(f"User {user_id} not found")
+        return None
+    
+    # Get notification preferences (from settings table or user defaults)
+    notification_method = user.get('notification_method', 'email')
+    notification_email = user.get('notification_email') or user.get('email')
+    notification_phone = user.get('notification_phone') or user.get('phone')
+    
+    return {
+        'user_id': user_id,
+        'summary': summary,
+        'notification_count': notification_count,
+        'subject': f"Notification Summary ({notification_count} new items)",
+        'message': f"You have {notification_count} new notification(s):\n\n{summary}",
+        'email': notification_email if notification_method in ['email', 'both'] else None,
+        'phone': notification_phone if notification_method in ['sms', 'both'] else None
+    }
+
+
+def _mark_delivered(notif: Dict[str, Any], delivered_at: str, delivery_method: str) -> bool:
+    """
+    Set the delivery status on one notification.
+    
+    Only the delivery attributes change, so attributes written by other
+    functions since the (eventually consistent) index read are kept.
+    Removing pending_delivery_at drops the item from the sparse UndeliveredIndex.
+    Returns False if the notification was already delivered or deleted.
+    """
+    try:
+        notifications_table.update_item(
+            Key={'user_id': notif['user_id'], 'notification_id': notif['notification_id']},
+            UpdateExpression='SET delivered_at = :now, delivery_method = :method REMOVE pending_delivery_at',
+            ConditionExpression='attribute_exists(pending_delivery_at)',
+            ExpressionAttributeValues={':now': delivered_at, ':method': delivery_method}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False  # Delivered or deleted since the index read; nothing to mark
+
+
+def _record_delivery(user_id: str, notification_count: Any, delivery_method: str) -> None:
+    """Mark the user's pending notifications as delivered and bump the sent counter."""
+    notifications = get_undelivered_notifications(user_id, notification_count)
+    
+    # One partial UpdateItem per notification, issued concurrently
+    now = datetime.utcnow().isoformat() + 'Z'
+    if notifications:
+        with ThreadPoolExecutor(max_workers=min(MAX_STATUS_UPDATE_WORKERS, len(notifications))) as executor:
+            # sum() so the first failed update is raised here
+            marked = sum(executor.map(lambda notif: _mark_delivered(notif, now, delivery_method), notifications))
+        if marked:
+            sync_state_table.update_item(
+                Key=STATS_KEY,
+                UpdateExpression='ADD notifications_sent :count',
+                ExpressionAttributeValues={':count': marked}
+            )
+
+
+def _complete_delivery(delivery: Dict[str, Any], email_delivered: Optional[bool]) -> bool:
+    """
+    Fall back to SMS if the email was not delivered, then mark the
+    user's pending notifications as delivered.
+    
+    email_delivered is None when SES gave no status for the email; it may
+    have gone out, so there is no SMS fallback and no retry.
+    Returns False only when a send was attempted and failed, so that the
+    record is retried. Errors after a successful send are logged rather
+    than raised: a retry would send the user the same summary again.
+    """
+    user_id = delivery['user_id']
+    if email_delivered is None:
+        logger.error(f"Unknown email delivery status for user {user_id}; not retrying or falling back to SMS")
+        return True
+    
+    delivered = email_delivered
+    attempted = bool(delivery['email'])
+    delivery_method = 'email' if delivered else None
+    
+    if delivery['phone'] and not delivered:
+        attempted = True
+        delivered = send_sms_via_twilio(delivery['phone'], delivery['message'][:160])  # SMS limit
+        delivery_method = 'sms' if delivered else None
+    
+    if not delivered:
+        logger.warning(f"Failed to deliver notification to user {user_id}")
+        return not attempted
+    
+    logger.info(f"Notification delivered to user {user_id} via {delivery_method}")
+    try:
+        _record_delivery(user_id, delivery['notification_count'], delivery_method)
+    except Exception as e:
+        logger.error(f"Delivered to user {user_id} but failed to record delivery status: {e}", exc_info=True)
+    return True
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Deliver notifications to users.
     Triggered by SQS queue.
+    
+    Records are independent and network-bound, so they are processed
+    concurrently. All email deliveries in the batch go out through one
+    SendBulkTemplatedEmail call. Records whose send failed are returned in
+    batchItemFailures so SQS only retries those messages; records that were
+    sent are never retried. Any other error fails the invocation so the
+    whole batch is retried.
     """
     try:
         # Process SQS records
         records = event.get('Records', [])
+        batch_item_failures = []
         
-        for record in records:
-            try:
-                body = json.loads(record['body'])
-                user_id = body.get('user_id')
-                summary = body.get('summary', '')
-                notification_count = body.get('notification_count', 0)
-                
-                if not user_id:
-                    logger.warning("Missing user_id in SQS message")
-                    continue
-                
-                # Get user preferences
-                user_response = users_table.get_item(Key={'user_id': user_id})
-                if 'Item' not in user_response:
-                    logger.warning(f"User {user_id} not found")
-                    continue
-                
-                user = user_response['Item']
-                
-                # Get notification preferences (from settings table or user defaults)
-                notification_method = user.get('notification_method', 'email')
-                notification_email = user.get('notification_email') or user.get('email')
-                notification_phone = user.get('notification_phone') or user.get('phone')
-                
-                # Prepare message
-                subject = f"Notification Summary ({notification_count} new items)"
-                message = f"You have {notification_count} new notification(s):\n\n{summary}"
+        if records:
+            with ThreadPoolExecutor(max_workers=min(MAX_DELIVERY_WORKERS, len(records))) as executor:
+                # Resolve recipients for every record
+                deliveries = []
+                futures = {executor.submit(_prepare_delivery, record): record for record in records}
+                for future, record in futures.items():
+                    try:
+                        delivery = future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing SQS record: {e}", exc_info=True)
+                        batch_item_failures.append({'itemIdentifier': record.get('messageId')})
+                        continue
+                    if delivery:
+                        deliveries.append((record, delivery))
                 
-                # Deliver based on method
-                delivered = False
-                delivery_method = None
+                # Send all summary emails together
+                email_deliveries = [delivery for _, delivery in deliveries if delivery['email']]
+                email_results = {}
+                if len(email_deliveries) > 1:
+                    sent = send_bulk_email_via_ses(email_deliveries)
+                    email_results = {id(delivery): ok for delivery, ok in zip(email_deliveries, sent)}
+                elif email_deliveries:
+                    delivery = email_deliveries[0]
+                    email_results[id(delivery)] = send_email_via_ses(delivery['email'], delivery['subject'], delivery['message'])
                 
-                if notification_method in ['email', 'both'] and notification_email:
-                    delivered = send_email_via_ses(notification_email, subject, message)
-                    delivery_method = 'email' if delivered else None
-                
-                if notification_method in ['sms', 'both'] and notification_phone and not delivered:
-                    delivered = send_sms_via_twilio(notification_phone, message[:160])  # SMS limit
-                    delivery_method = 'sms' if delivered else None
-                
-                if delivered:
-                    # Update notification delivery status
-                    # Get recent notifications for this user
-                    response = notifications_table.query(
-                        KeyConditionExpression='user_id = :user_id',
-                        FilterExpression='attribute_not_exists(delivered_at)',
-                        ExpressionAttributeValues={':user_id': user_id},
-                        Limit=notification_count
-                    )
-                    
-                    now = datetime.utcnow().isoformat() + 'Z'
-                    for notif in response.get('Items', []):
-                        notifications_table.update_item(
-                            Key={
-                                'user_id': notif['user_id'],
-                                'notification_id': notif['notification_id']
-                            },
-                            UpdateExpression='SET delivered_at = :delivered_at, delivery_method = :delivery_method',
-                            ExpressionAttributeValues={
-                                ':delivered_at': now,
-                                ':delivery_method': delivery_method
-                            }
-                        )
-                    
-                    logger.info(f"Notification delivered to user {user_id} via {delivery_method}")
-                else:
-                    logger.warning(f"Failed to deliver notification to user {user_id}")
-                
-            except Exception as e:
-                logger.error(f"Error processing SQS record: {e}", exc_info=True)
-                continue
+                # SMS fallback and delivery-status updates
+                futures = {
+                    executor.submit(_complete_delivery, delivery, email_results.get(id(delivery), False)): record
+                    for record, delivery in deliveries
+                }
+                for future, record in futures.items():
+                    try:
+                        delivered = future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing SQS record: {e}", exc_info=True)
+                        delivered = False
+                    if not delivered:
+                        batch_item_failures.append({'itemIdentifier': record.get('messageId')})
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'message': 'Delivery complete'})
+            'body': _json_dumps({'message': 'Delivery complete'}),
+            'batchItemFailures': batch_item_failures
         }
         
     except Exception as e:
         logger.error(f"Error in deliver: {str(e)}", exc_info=True)
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'message': 'Delivery failed'})
-        }
-
+        # With ReportBatchItemFailures a response without batchItemFailures
+        # counts as full success; raise so SQS retries the whole batch
+        raise
@@ -3,129 +3,420 @@ Lambda function to process notifications from all active data sources.
 Triggered by EventBridge every 10-15 minutes.
 """
 
+import base64
+import email.parser
+import imaplib
 import json
 import os
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+import quopri
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sources_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_DATA_SOURCES', 'data_sources'))
+# Prefer orjson (C extension) for JSON encoding; fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    _json_dumps = json.dumps
+
+# Prefer fast_mail_parser (Rust) for MIME parsing; fall back to the stdlib email package
+try:
+    from fast_mail_parser import parse_email, ParseError
+except ImportError:
+    parse_email = None
+
+# RFC 2047 encoded-word, e.g. =?utf-8?B?...?=
+_ENCODED_WORD_RE = re.compile(r'=\?([^?]+)\?([QqBb])\?([^?]*)\?=')
+# Whitespace between adjacent encoded-words is not part of the text
+_ENCODED_WORD_GAP_RE = re.compile(r'(?<=\?=)\s+(?==\?)')
+
+# Start of an untagged FETCH response: "<seq> ("
+_FETCH_SEQUENCE_RE = re.compile(rb'(\d+) \(')
+_INTERNALDATE_RE = re.compile(rb'INTERNALDATE "([^"]+)"')
+
+# Stateless, so one instance is shared by all worker threads
+email_parser = email.parser.BytesParser()
+
+MAX_SOURCE_WORKERS = 16
+
+# Initialize AWS clients (module scope so warm invocations reuse the keep-alive connections)
+_boto_config = Config(
+    tcp_keepalive=True,
+    connect_timeout=1.0,  # AWS endpoints are in-region; fail fast and let retries take over
+    read_timeout=5.0,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    max_pool_connections=MAX_SOURCE_WORKERS  # one per source worker thread
+)
+DYNAMODB_TABLE_DATA_SOURCES = os.environ.get('DYNAMODB_TABLE_DATA_SOURCES', 'data_sources')
+dynamodb = boto3.resource('dynamodb', config=_boto_config)
+dynamodb_client = boto3.client('dynamodb', config=_boto_config)
 notifications_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_NOTIFICATIONS', 'notifications'))
 sync_state_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_SYNC_STATE', 'sync_state'))
-secrets_manager = boto3.client('secretsmanager')
-sqs = boto3.client('sqs')
+secrets_manager = boto3.client('secretsmanager', config=_boto_config)
+sqs = boto3.client('sqs', config=_boto_config)
 
 # SQS queue for summarization
 SUMMARIZATION_QUEUE_URL = os.environ.get('SUMMARIZATION_QUEUE_URL', '')
 
+# Decrypted credentials cached across warm invocations: secret_arn -> (fetched_at, value)
+SECRET_CACHE_TTL_SECONDS = 900
+SECRET_CACHE_MAX_SIZE = 128
+_secret_cache: Dict[str, Tuple[float, str]] = {}
+_secret_cache_lock = threading.Lock()
+
+# Logged-in IMAP connections kept across warm invocations: (host, port, email) -> connection.
+# A connection is removed while in use, so each one is only ever used by a single thread.
+_imap_connections: Dict[Tuple[str, int, str], imaplib.IMAP4] = {}
+_imap_connections_lock = threading.Lock()
+# Socket timeout, so a connection left half-open while the container was frozen fails instead of hanging
+IMAP_TIMEOUT_SECONDS = 30
+
+# Only the first part of each message body is downloaded; content is cut to 500 chars anyway
+IMAP_BODY_FETCH_BYTES = 16384
+# Bytes of the text part decoded into the (500-character) content field
+BODY_DECODE_BYTES = 2048
+# Cheap first pass used to drop already-processed messages before downloading them
+IMAP_PREFETCH_ITEMS = '(INTERNALDATE BODY.PEEK[HEADER.FIELDS (MESSAGE-ID DATE)])'
+# Full header block plus a bounded slice of the body; PEEK leaves \Seen untouched
+IMAP_FETCH_ITEMS = f'(BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{IMAP_BODY_FETCH_BYTES}>)'
+
+# GSI on data_sources keyed by status
+SOURCES_STATUS_INDEX_NAME = 'status-index'
+SOURCES_PAGE_SIZE = 100
+
+# BatchGetItem limit
+BATCH_GET_MAX_KEYS = 100
+# UnprocessedKeys retries: exponential backoff with full jitter, then give up
+BATCH_GET_MAX_RETRIES = 5
+BATCH_GET_RETRY_BASE_SECONDS = 0.05
+BATCH_GET_RETRY_MAX_SECONDS = 2.0
+
+# Key of the singleton sync_state item holding the most recent run time
+GLOBAL_SYNC_KEY = {'user_id': 'GLOBAL', 'source_id': 'GLOBAL'}
+# Key of the sync_state item holding the notification counters read by status-check
+STATS_KEY = {'user_id': 'GLOBAL', 'source_id': 'STATS'}
+
+
+def _from_attribute_value(value: Dict[str, Any]) -> Any:
+    """Convert a low-level DynamoDB AttributeValue for the scalar types we store."""
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        number = value['N']
+        return int(number) if number.lstrip('-').isdigit() else float(number)
+    if 'BOOL' in value:
+        return value['BOOL']
+    return None  # NULL (and types this table does not use)
+
+
+def iter_active_sources() -> Iterator[Dict[str, Any]]:
+    """Yield active data sources from the status index, one page at a time."""
+    paginator = dynamodb_client.get_paginator('query')
+    pages = paginator.paginate(
+        TableName=DYNAMODB_TABLE_DATA_SOURCES,
+        IndexName=SOURCES_STATUS_INDEX_NAME,
+        KeyConditionExpression='#st = :status',
+        # Only the fields _process_source uses
+        ProjectionExpression='user_id, source_id, source_type, email, credentials_secret_arn, host, port, use_ssl',
+        ExpressionAttributeNames={'#st': 'status'},  # status is a reserved word
+        ExpressionAttributeValues={':status': {'S': 'active'}},
+        PaginationConfig={'PageSize': SOURCES_PAGE_SIZE}
+    )
+    for page in pages:
+        for raw_item in page.get('Items', []):
+            yield {key: _from_attribute_value(value) for key, value in raw_item.items()}
+
 
 def decrypt_credentials(secret_arn: str) -> str:
-    """Retrieve credentials from AWS Secrets Manager."""
+    """
+    Retrieve credentials from AWS Secrets Manager, served from the in-process cache while fresh.
+    
+    secret_arn is the source's credentials_secret_arn. A few sources created
+    by an earlier build hold the secret name there instead; Secrets Manager
+    accepts either as the SecretId.
+    """
+    now = time.monotonic()
+    with _secret_cache_lock:
+        cached = _secret_cache.get(secret_arn)
+    if cached and now - cached[0] < SECRET_CACHE_TTL_SECONDS:
+        return cached[1]
+    
     try:
         response = secrets_manager.get_secret_value(SecretId=secret_arn)
-        return response['SecretString']
     except ClientError as e:
         logger.error(f"Error retrieving secret: {e}")
         raise
+    
+    secret = response['SecretString']
+    with _secret_cache_lock:
+        if len(_secret_cache) >= SECRET_CACHE_MAX_SIZE and secret_arn not in _secret_cache:
+            # Evict the oldest entry (dicts keep insertion order)
+            _secret_cache.pop(next(iter(_secret_cache)))
+        _secret_cache[secret_arn] = (now, secret)
+    return secret
 
 
-def fetch_emails_imap(email: str, password: str, host: str, port: int, use_ssl: bool, since_date: datetime = None) -> List[Dict[str, Any]]:
+def _decode_encoded_word(match: re.Match) -> str:
+    """Decode a single RFC 2047 encoded-word; leave it as-is if it is malformed."""
+    charset, encoding, text = match.groups()
+    data = text.encode('ascii', errors='ignore')
+    try:
+        if encoding in 'Bb':
+            raw = base64.b64decode(data + b'=' * (-len(data) % 4))
+        else:
+            raw = quopri.decodestring(data, header=True)
+        return raw.decode(charset, errors='replace')
+    except (LookupError, ValueError):
+        return match.group(0)
+
+
+def _decode_rfc2047(value: str) -> str:
+    """Decode RFC 2047 encoded-words in a header value with one regex pass."""
+    return _ENCODED_WORD_RE.sub(_decode_encoded_word, _ENCODED_WORD_GAP_RE.sub('', value))
+
+
+def _parse_message_stdlib(raw: bytes) -> Dict[str, str]:
+    """Parse an RFC822 message with the stdlib email package."""
+    email_message = email_parser.parsebytes(raw)
+    
+    # Decode subject (plain ASCII subjects, the common case, need no decoding)
+    subject = email_message['Subject']
+    if subject and '=?' in subject:
+        subject = _decode_rfc2047(subject)
+    
+    # Get email body (first inline text/plain part)
+    payload = b''
+    if email_message.is_multipart():
+        for part in email_message.walk():
+            if part.get_content_type() == "text/plain" and part.get_content_disposition() != 'attachment':
+                payload = part.get_payload(decode=True) or b''
+                break
+    else:
+        payload = email_message.get_payload(decode=True) or b''
+    # Only 500 characters are stored, so never decode more than a few KB
+    body = payload[:BODY_DECODE_BYTES].decode('utf-8', errors='ignore')
+    
+    return {
+        'subject': subject or '',
+        'from': email_message['From'] or '',
+        'date': email_message['Date'],
+        'message_id': email_message.get('Message-ID', ''),
+        'body': body
+    }
+
+
+def _parse_message(raw: bytes) -> Dict[str, str]:
     """
-    Fetch unread emails from IMAP server.
-    Returns list of email notifications.
+    Parse an RFC822 message into subject, from, date, message_id and plain-text body.
+    Uses fast_mail_parser when installed, the stdlib otherwise.
     """
+    if parse_email is None:
+        return _parse_message_stdlib(raw)
+    try:
+        mail = parse_email(raw)
+    except ParseError:
+        return _parse_message_stdlib(raw)
+    
+    headers = {name.lower(): value for name, value in mail.headers.items()}
+    return {
+        'subject': mail.subject or '',
+        'from': headers.get('from', ''),
+        'date': headers.get('date'),
+        'message_id': headers.get('message-id', ''),
+        'body': mail.text_plain[0] if mail.text_plain else ''
+    }
+
+
+def _group_fetch_literals(fetch_data: List[Any]) -> Dict[bytes, Dict[str, bytes]]:
+    """
+    Split a multi-message FETCH response into
+    {sequence number: {'header': ..., 'text': ..., 'internaldate': ...}}.
+    Only the first literal of each message carries the sequence number, so later
+    literals belong to the most recently seen message.
+    """
+    messages = {}
+    current = None
+    for part in fetch_data:
+        if not isinstance(part, tuple):
+            continue
+        prefix = part[0]
+        match = _FETCH_SEQUENCE_RE.match(prefix)
+        if match:
+            current = messages.setdefault(match.group(1), {})
+        if current is not None:
+            current['header' if b'HEADER' in prefix else 'text'] = part[1]
+            date_match = _INTERNALDATE_RE.search(prefix)
+            if date_match:
+                current['internaldate'] = date_match.group(1)
+    return messages
+
+
+def _close_imap(mail: imaplib.IMAP4) -> None:
+    """Log out of an IMAP connection, ignoring errors from a dead socket."""
+    try:
+        mail.logout()
+    except Exception:
+        pass
+
+
+def _checkout_imap(connection_key: Tuple[str, int, str], password: str, use_ssl: bool) -> imaplib.IMAP4:
+    """
+    Take a logged-in IMAP connection for (host, port, email) from the cache,
+    or open a new one if there is none or the cached one no longer answers NOOP.
+    """
+    with _imap_connections_lock:
+        mail = _imap_connections.pop(connection_key, None)
+    if mail is not None:
+        try:
+            mail.noop()
+            return mail
+        except (imaplib.IMAP4.error, OSError):
+            _close_imap(mail)
+    
+    host, port, email = connection_key
+    if use_ssl:
+        mail = imaplib.IMAP4_SSL(host, port, timeout=IMAP_TIMEOUT_SECONDS)
+    else:
+        mail = imaplib.IMAP4(host, port, timeout=IMAP_TIMEOUT_SECONDS)
     try:
-        import imaplib
-        import email
-        from email.header import decode_header
-        
-        # Connect to IMAP server
-        if use_ssl:
-            mail = imaplib.IMAP4_SSL(host, port)
-        else:
-            mail = imaplib.IMAP4(host, port)
-        
         mail.login(email, password)
+    except Exception:
+        # Don't leak the socket of a connection that never got logged in
+        _close_imap(mail)
+        raise
+    return mail
+
+
+def _checkin_imap(connection_key: Tuple[str, int, str], mail: imaplib.IMAP4) -> None:
+    """Return a healthy connection to the cache for the next warm invocation."""
+    with _imap_connections_lock:
+        if connection_key not in _imap_connections:
+            _imap_connections[connection_key] = mail
+            return
+    # Another worker already cached one for the same mailbox
+    _close_imap(mail)
+
+
+def fetch_emails_imap(email: str, password: str, host: str, port: int, use_ssl: bool, since_date: datetime = None,
+                      last_message_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch unread emails from IMAP server.
+    Returns list of email notifications, newest first.
+    
+    Dates and Message-IDs of the candidates are fetched first in one round-trip;
+    only messages newer than since_date and last_message_id are downloaded and decoded.
+    """
+    connection_key = (host, port, email)
+    mail = None
+    try:
+        mail = _checkout_imap(connection_key, password, use_ssl)
         mail.select('INBOX')
         
         # Search for unread emails
         search_criteria = ['UNSEEN']
         if since_date:
-            date_str = since_date.strftime("%d-%b-%Y")
-            search_criteria.append(f"SINCE {date_str}")
+            # Day granularity on the server; the exact cut-off is applied to INTERNALDATE below
+            search_criteria += ['SINCE', since_date.strftime("%d-%b-%Y")]
         
-        status, message_numbers = mail.search(None, ' '.join(search_criteria))
+        status, message_numbers = mail.search(None, *search_criteria)
         
         if status != 'OK':
             logger.warning(f"IMAP search failed for {email}")
+            _checkin_imap(connection_key, mail)
             return []
         
         message_ids = message_numbers[0].split()
         message_ids.reverse()  # Newest first
         message_ids = message_ids[:10]  # Top 10 only
         
-        notifications = []
+        if not message_ids:
+            _checkin_imap(connection_key, mail)
+            return []
         
+        # First pass: Message-ID and Date only, for all candidates at once
+        status, header_data = mail.fetch(b','.join(message_ids), IMAP_PREFETCH_ITEMS)
+        if status != 'OK':
+            logger.warning(f"IMAP header fetch failed for {email}")
+            _checkin_imap(connection_key, mail)
+            return []
+        
+        literals_by_id = _group_fetch_literals(header_data)
+        
+        candidates = []
         for msg_id in message_ids:
+            literals = literals_by_id.get(msg_id)
+            if literals is None:
+                continue
+            headers = email_parser.parsebytes(literals.get('header', b''), headersonly=True)
+            message_id = headers.get('Message-ID', '')
+            if last_message_id and message_id == last_message_id:
+                break  # This and everything older was handled by a previous run
+            
+            # Arrival time from the server (INTERNALDATE), falling back to the Date header
             try:
-                status, msg_data = mail.fetch(msg_id, '(RFC822)')
-                if status != 'OK':
-                    continue
-                
-                email_body = msg_data[0][1]
-                email_message = email.message_from_bytes(email_body)
-                
-                # Parse headers
-                subject = email_message['Subject']
-                from_addr = email_message['From']
-                date_str = email_message['Date']
-                
-                # Decode subject
-                if subject:
-                    decoded_subject = decode_header(subject)[0]
-                    if isinstance(decoded_subject[0], bytes):
-                        subject = decoded_subject[0].decode(decoded_subject[1] or 'utf-8')
-                    else:
-                        subject = decoded_subject[0]
-                
-                # Parse date
-                try:
-                    from email.utils import parsedate_to_datetime
-                    received_at = parsedate_to_datetime(date_str) if date_str else datetime.utcnow()
-                except:
+                if 'internaldate' in literals:
+                    received_at = datetime.strptime(literals['internaldate'].decode('ascii').strip(), '%d-%b-%Y %H:%M:%S %z')
+                elif headers['Date']:
+                    received_at = parsedate_to_datetime(headers['Date'])
+                else:
                     received_at = datetime.utcnow()
-                
-                # Filter by exact timestamp if since_date provided
-                if since_date and received_at.replace(tzinfo=None) <= since_date:
+            except:
+                received_at = datetime.utcnow()
+            
+            # Filter by exact timestamp if since_date provided (since_date is naive UTC)
+            if received_at.tzinfo is not None:
+                received_at = received_at.astimezone(timezone.utc)
+            if since_date and received_at.replace(tzinfo=None) <= since_date:
+                continue
+            
+            candidates.append((msg_id, received_at))
+        
+        notifications = []
+        if not candidates:
+            _checkin_imap(connection_key, mail)
+            return notifications
+        
+        # Second pass: download only the surviving messages, all in one FETCH
+        status, msg_data = mail.fetch(b','.join(msg_id for msg_id, _ in candidates), IMAP_FETCH_ITEMS)
+        if status != 'OK':
+            logger.warning(f"IMAP message fetch failed for {email}")
+            _checkin_imap(connection_key, mail)
+            return notifications
+        literals_by_id = _group_fetch_literals(msg_data)
+        
+        for msg_id, received_at in candidates:
+            try:
+                literals = literals_by_id.get(msg_id)
+                if literals is None:
                     continue
                 
-                # Get email body
-                body = ""
-                if email_message.is_multipart():
-                    for part in email_message.walk():
-                        content_type = part.get_content_type()
-                        if content_type == "text/plain":
-                            body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                            break
-                else:
-                    body = email_message.get_payload(decode=True).decode('utf-8', errors='ignore')
+                # Reassemble headers + truncated body; the parsers tolerate the cut-off MIME tree
+                parsed = _parse_message(literals.get('header', b'') + literals.get('text', b''))
                 
                 notification = {
                     'source_type': 'email',
                     'source_id': email,
-                    'subject': subject or '',
-                    'from': from_addr or '',
-                    'content': body[:500],  # Limit content size
+                    'subject': parsed['subject'],
+                    'from': parsed['from'],
+                    'content': parsed['body'][:500],  # Limit content size
                     'received_at': received_at.isoformat(),
-                    'message_id': email_message.get('Message-ID', '')
+                    'message_id': parsed['message_id']
                 }
                 
                 notifications.append(notification)
@@ -134,156 +425,229 @@ def fetch_emails_imap(email: str, password: str, host: str, port: int, use_ssl:
                 logger.error(f"Error processing email {msg_id}: {e}")
                 continue
         
-        mail.logout()
+        _checkin_imap(connection_key, mail)
         return notifications
         
     except Exception as e:
         logger.error(f"Error fetching emails from {email}: {e}")
+        if mail is not None:
+            _close_imap(mail)
         return []
 
 
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def filter_new_notifications(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Process notifications from all active data sources.
-    Triggered by EventBridge schedule.
+    Drop notifications whose key already exists in the table.
+    Looks the keys up with BatchGetItem (100 keys per request, key attributes only).
+    Raises if keys are still unprocessed after BATCH_GET_MAX_RETRIES retries,
+    since treating them as new would store (and deliver) duplicates.
+    """
+    # BatchGetItem rejects repeated keys, and one fetch can return the same Message-ID twice
+    keys = list(dict.fromkeys((item['user_id'], item['notification_id']) for item in items))
+    existing = set()
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request_items = {
+            notifications_table.name: {
+                'Keys': [
+                    {'user_id': user_id, 'notification_id': notification_id}
+                    for user_id, notification_id in keys[start:start + BATCH_GET_MAX_KEYS]
+                ],
+                'ProjectionExpression': 'user_id, notification_id'
+            }
+        }
+        attempt = 0
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for found in response.get('Responses', {}).get(notifications_table.name, []):
+                existing.add((found['user_id'], found['notification_id']))
+            request_items = response.get('UnprocessedKeys')
+            if request_items:
+                # Unprocessed keys mean the table is throttling; back off before retrying
+                if attempt >= BATCH_GET_MAX_RETRIES:
+                    raise RuntimeError(f"BatchGetItem still had unprocessed keys after {attempt} retries")
+                time.sleep(random.uniform(0, min(BATCH_GET_RETRY_MAX_SECONDS, BATCH_GET_RETRY_BASE_SECONDS * 2 ** attempt)))
+                attempt += 1
+    
+    return [item for item in items if (item['user_id'], item['notification_id']) not in existing]
+
+
+def _process_source(source: Dict[str, Any]) -> Tuple[int, Optional[Dict[str, Any]]]:
     """
+    Fetch and store new notifications for a single data source.
+    Returns the number of notifications stored and the new sync_state item
+    (written by the caller together with the other sources' items).
+    """
+    user_id = source['user_id']
+    source_id = source['source_id']
+    source_type = source.get('source_type', 'email')
+    
+    new_notifications = 0
+    previous_sync = None
+    
     try:
-        logger.info("Starting notification processing...")
-        
-        # Get all active data sources
-        response = sources_table.scan(
-            FilterExpression='status = :status',
-            ExpressionAttributeValues={':status': 'active'}
+        # Get last sync timestamp
+        sync_response = sync_state_table.get_item(
+            Key={'user_id': user_id, 'source_id': source_id}
         )
+        previous_sync = sync_response.get('Item', {})
         
-        active_sources = response.get('Items', [])
-        logger.info(f"Found {len(active_sources)} active data sources")
+        since_date = None
+        last_message_id = None
+        if 'Item' in sync_response:
+            last_message_id = sync_response['Item'].get('last_processed_item_id')
+            last_sync_str = sync_response['Item'].get('last_sync_timestamp')
+            if last_sync_str:
+                try:
+                    since_date = datetime.fromisoformat(last_sync_str.replace('Z', '+00:00'))
+                    since_date = since_date.replace(tzinfo=None)
+                except:
+                    # Default to 15 minutes ago if parsing fails
+                    since_date = datetime.utcnow() - timedelta(minutes=15)
+        else:
+            # First sync - only get emails from last 15 minutes
+            since_date = datetime.utcnow() - timedelta(minutes=15)
         
-        total_new_notifications = 0
+        # Fetch notifications based on source type
+        notifications = []
+        if source_type == 'email':
+            email = source.get('email')
+            secret_arn = source.get('credentials_secret_arn')
+            host = source.get('host')
+            port = source.get('port', 993)
+            use_ssl = source.get('use_ssl', True)
+            
+            if not email or not secret_arn:
+                logger.warning(f"Missing email or credentials for source {source_id}")
+                return 0, None
+            
+            password = decrypt_credentials(secret_arn)
+            notifications = fetch_emails_imap(email, password, host, port, use_ssl, since_date, last_message_id)
         
-        for source in active_sources:
-            user_id = source['user_id']
-            source_id = source['source_id']
-            source_type = source.get('source_type', 'email')
+        logger.info(f"Found {len(notifications)} new notifications from {source_id}")
+        
+        # Default created_at, formatted once rather than for every notification
+        now_iso = datetime.utcnow().isoformat() + 'Z'
+        notification_items = []
+        for notification in notifications:
+            notification_id = notification.get('message_id') or f"{source_id}_{datetime.utcnow().timestamp()}"
             
-            try:
-                # Get last sync timestamp
-                sync_response = sync_state_table.get_item(
-                    Key={'user_id': user_id, 'source_id': source_id}
-                )
-                
-                since_date = None
-                if 'Item' in sync_response:
-                    last_sync_str = sync_response['Item'].get('last_sync_timestamp')
-                    if last_sync_str:
-                        try:
-                            since_date = datetime.fromisoformat(last_sync_str.replace('Z', '+00:00'))
-                            since_date = since_date.replace(tzinfo=None)
-                        except:
-                            # Default to 15 minutes ago if parsing fails
-                            since_date = datetime.utcnow() - timedelta(minutes=15)
-                else:
-                    # First sync - only get emails from last 15 minutes
-                    since_date = datetime.utcnow() - timedelta(minutes=15)
-                
-                # Fetch notifications based on source type
-                notifications = []
-                if source_type == 'email':
-                    email = source.get('email')
-                    secret_arn = source.get('credentials_secret_arn')
-                    host = source.get('host')
-                    port = source.get('port', 993)
-                    use_ssl = source.get('use_ssl', True)
-                    
-                    if not email or not secret_arn:
-                        logger.warning(f"Missing email or credentials for source {source_id}")
-                        continue
-                    
-                    password = decrypt_credentials(secret_arn)
-                    notifications = fetch_emails_imap(email, password, host, port, use_ssl, since_date)
-                
-                logger.info(f"Found {len(notifications)} new notifications from {source_id}")
-                
-                # Store notifications in DynamoDB
-                for notification in notifications:
-                    notification_id = notification.get('message_id') or f"{source_id}_{datetime.utcnow().timestamp()}"
-                    
-                    notification_item = {
-                        'user_id': user_id,
-                        'notification_id': notification_id,
-                        'source_type': source_type,
-                        'source_id': source_id,
-                        'content': notification.get('content', ''),
-                        'subject': notification.get('subject', ''),
-                        'from': notification.get('from', ''),
-                        'created_at': notification.get('received_at', datetime.utcnow().isoformat() + 'Z'),
-                        'delivered_at': None,
-                        'delivery_method': None
-                    }
-                    
-                    try:
-                        notifications_table.put_item(Item=notification_item)
-                        total_new_notifications += 1
-                    except ClientError as e:
-                        logger.error(f"Error storing notification: {e}")
-                        continue
-                
-                # Update sync state
-                now = datetime.utcnow().isoformat() + 'Z'
-                sync_state_table.put_item(
-                    Item={
+            created_at = notification.get('received_at') or now_iso
+            notification_items.append({
+                'user_id': user_id,
+                'notification_id': notification_id,
+                'source_type': source_type,
+                'source_id': source_id,
+                'content': notification.get('content', ''),
+                'subject': notification.get('subject', ''),
+                'from': notification.get('from', ''),
+                'created_at': created_at,
+                # Sort key of the sparse UndeliveredIndex; removed once delivered.
+                # delivered_at is left unset (not NULL) until delivery.
+                'pending_delivery_at': created_at,
+                # Sort key of the sparse UnsummarizedIndex; removed once summarized
+                'pending_summary_key': f"{source_id}#{created_at}"
+            })
+        
+        # Skip messages a previous run already stored; overwriting them would
+        # reset their summary/delivery state and deliver them a second time
+        new_items = filter_new_notifications(notification_items)
+        
+        # Store notifications in DynamoDB, 25 items per BatchWriteItem request.
+        # A failed batch raises into the error path below, so the sync state is not advanced.
+        with notifications_table.batch_writer(overwrite_by_pkeys=['user_id', 'notification_id']) as batch:
+            for item in new_items:
+                batch.put_item(Item=item)
+        new_notifications = len(new_items)
+        
+        # New sync state
+        sync_item = {
+            'user_id': user_id,
+            'source_id': source_id,
+            'last_sync_timestamp': now_iso,
+            # Newest message seen; the next run stops scanning when it reaches it
+            'last_processed_item_id': notifications[0].get('message_id') or None if notifications else last_message_id,
+            'error_count': 0,
+            'last_error': None
+        }
+        
+        # Trigger summarization if new notifications found
+        if new_items:
+            # Send message to summarization queue
+            if SUMMARIZATION_QUEUE_URL:
+                sqs.send_message(
+                    QueueUrl=SUMMARIZATION_QUEUE_URL,
+                    MessageBody=_json_dumps({
                         'user_id': user_id,
                         'source_id': source_id,
-                        'last_sync_timestamp': now,
-                        'last_processed_item_id': notification_id if notifications else None,
-                        'error_count': 0,
-                        'last_error': None
-                    }
+                        'notification_count': new_notifications
+                    })
                 )
-                
-                # Trigger summarization if new notifications found
-                if notifications:
-                    # Send message to summarization queue
-                    if SUMMARIZATION_QUEUE_URL:
-                        sqs.send_message(
-                            QueueUrl=SUMMARIZATION_QUEUE_URL,
-                            MessageBody=json.dumps({
-                                'user_id': user_id,
-                                'source_id': source_id,
-                                'notification_count': len(notifications)
-                            })
-                        )
-                
-            except Exception as e:
-                logger.error(f"Error processing source {source_id}: {e}", exc_info=True)
-                
-                # Update sync state with error
-                try:
-                    sync_response = sync_state_table.get_item(
-                        Key={'user_id': user_id, 'source_id': source_id}
-                    )
-                    error_count = 0
-                    if 'Item' in sync_response:
-                        error_count = sync_response['Item'].get('error_count', 0)
-                    
-                    sync_state_table.put_item(
-                        Item={
-                            'user_id': user_id,
-                            'source_id': source_id,
-                            'last_sync_timestamp': sync_response['Item'].get('last_sync_timestamp') if 'Item' in sync_response else None,
-                            'error_count': error_count + 1,
-                            'last_error': str(e)
-                        }
-                    )
-                except:
-                    pass
-                continue
+        
+        return new_notifications, sync_item
+        
+    except Exception as e:
+        logger.error(f"Error processing source {source_id}: {e}", exc_info=True)
+        
+        if previous_sync is None:
+            # The sync state could not even be read; leave it untouched
+            return new_notifications, None
+        
+        # Sync state with error; keep the previous progress markers
+        return new_notifications, {
+            'user_id': user_id,
+            'source_id': source_id,
+            'last_sync_timestamp': previous_sync.get('last_sync_timestamp'),
+            'last_processed_item_id': previous_sync.get('last_processed_item_id'),
+            'error_count': previous_sync.get('error_count', 0) + 1,
+            'last_error': str(e)
+        }
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Process notifications from all active data sources.
+    Triggered by EventBridge schedule.
+    """
+    try:
+        logger.info("Starting notification processing...")
+        
+        total_new_notifications = 0
+        sync_updates = []
+        
+        # IMAP logins and fetches are network-bound, so poll sources concurrently.
+        # Sources are submitted as each page of the index arrives, so the first
+        # fetches start before the remaining pages have been read.
+        with ThreadPoolExecutor(max_workers=MAX_SOURCE_WORKERS) as executor:
+            futures = [executor.submit(_process_source, source) for source in iter_active_sources()]
+            logger.info(f"Found {len(futures)} active data sources")
+            
+            for future in futures:
+                new_notifications, sync_item = future.result()
+                total_new_notifications += new_notifications
+                if sync_item:
+                    sync_updates.append(sync_item)
+        
+        # Record the run time so status-check can read it with a single GetItem
+        sync_updates.append({**GLOBAL_SYNC_KEY, 'last_sync_timestamp': datetime.utcnow().isoformat() + 'Z'})
+        
+        # Flush all sync states at once (25 items per BatchWriteItem request)
+        with sync_state_table.batch_writer() as batch:
+            for sync_item in sync_updates:
+                batch.put_item(Item=sync_item)
+        
+        # One atomic counter update per run, so stats never count the notifications table
+        if total_new_notifications:
+            sync_state_table.update_item(
+                Key=STATS_KEY,
+                UpdateExpression='ADD total_notifications :count',
+                ExpressionAttributeValues={':count': total_new_notifications}
+            )
         
         logger.info(f"Processing complete. Total new notifications: {total_new_notifications}")
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'body': _json_dumps({
                 'message': 'Processing complete',
                 'total_new_notifications': total_new_notifications
             })
@@ -293,6 +657,6 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error(f"Error in process-notifications: {str(e)}", exc_info=True)
         return {
             'statusCode': 500,
-            'body': json.dumps({'message': 'Processing failed'})
+            'body': _json_dumps({'message': 'Processing failed'})
         }
 
@@ -6,20 +6,70 @@ import json
 import os
 import logging
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import boto3
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Prefer orjson (C extension) for JSON encoding; fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    _json_dumps = json.dumps
+
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb')
 sources_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_DATA_SOURCES', 'data_sources'))
-notifications_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_NOTIFICATIONS', 'notifications'))
 sync_state_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_SYNC_STATE', 'sync_state'))
 
+SOURCES_STATUS_INDEX_NAME = 'status-index'
+# Singleton sync_state item written by process-notifications after each run
+GLOBAL_SYNC_KEY = {'user_id': 'GLOBAL', 'source_id': 'GLOBAL'}
+# Notification counters, incremented by process-notifications (total) and deliver (sent)
+STATS_KEY = {'user_id': 'GLOBAL', 'source_id': 'STATS'}
+
+
+def count_query(table: Any, **query_kwargs: Any) -> int:
+    """Count the items matched by a Select=COUNT query, following pagination."""
+    query_kwargs['Select'] = 'COUNT'
+    total = 0
+    while True:
+        response = table.query(**query_kwargs)
+        total += response.get('Count', 0)
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return total
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def get_notification_counts() -> Dict[str, int]:
+    """Get the total and delivered notification counters with one GetItem."""
+    response = sync_state_table.get_item(
+        Key=STATS_KEY,
+        ProjectionExpression='total_notifications, notifications_sent'
+    )
+    item = response.get('Item', {})
+    return {
+        'total_notifications': int(item.get('total_notifications', 0)),
+        'notifications_sent': int(item.get('notifications_sent', 0))
+    }
+
+
+def get_last_sync() -> Optional[str]:
+    """Get the timestamp of the most recent processing run."""
+    response = sync_state_table.get_item(
+        Key=GLOBAL_SYNC_KEY,
+        ProjectionExpression='last_sync_timestamp'
+    )
+    return response.get('Item', {}).get('last_sync_timestamp')
+
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
@@ -55,7 +105,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 401,
                 'headers': cors_headers,
-                'body': json.dumps({'message': 'Unauthorized'})
+                'body': _json_dumps({'message': 'Unauthorized'})
             }
         
         # TODO: Extract user_id from JWT token
@@ -69,7 +119,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 404,
                 'headers': cors_headers,
-                'body': json.dumps({'message': 'Not found'})
+                'body': _json_dumps({'message': 'Not found'})
             }
             
     except Exception as e:
@@ -77,7 +127,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': cors_headers if 'cors_headers' in locals() else {},
-            'body': json.dumps({'message': 'Internal server error'})
+            'body': _json_dumps({'message': 'Internal server error'})
         }
 
 
@@ -85,30 +135,19 @@ def handle_get_stats(cors_headers: Dict[str, str]) -> Dict[str, Any]:
     """Get statistics."""
     try:
         # Count active sources
-        sources_response = sources_table.scan(
-            FilterExpression='status = :status',
-            ExpressionAttributeValues={':status': 'active'}
+        active_sources = count_query(
+            sources_table,
+            IndexName=SOURCES_STATUS_INDEX_NAME,
+            KeyConditionExpression=Key('status').eq('active')
         )
-        active_sources = len(sources_response.get('Items', []))
         
-        # Count total notifications (approximate)
-        notifications_response = notifications_table.scan(Select='COUNT')
-        total_emails = notifications_response.get('Count', 0)
-        
-        # Count delivered notifications
-        delivered_response = notifications_table.scan(
-            FilterExpression='attribute_exists(delivered_at)',
-            Select='COUNT'
-        )
-        notifications_sent = delivered_response.get('Count', 0)
+        # Total and delivered notifications, from the atomic counters
+        counts = get_notification_counts()
+        total_emails = counts['total_notifications']
+        notifications_sent = counts['notifications_sent']
         
         # Get last sync time
-        sync_response = sync_state_table.scan()
-        last_sync = None
-        if sync_response.get('Items'):
-            sync_times = [item.get('last_sync_timestamp') for item in sync_response['Items'] if item.get('last_sync_timestamp')]
-            if sync_times:
-                last_sync = max(sync_times)
+        last_sync = get_last_sync()
         
         stats = {
             'total_emails': total_emails,
@@ -120,14 +159,14 @@ def handle_get_stats(cors_headers: Dict[str, str]) -> Dict[str, Any]:
         return {
             'statusCode': 200,
             'headers': cors_headers,
-            'body': json.dumps(stats)
+            'body': _json_dumps(stats)
         }
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
         return {
             'statusCode': 500,
             'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
+            'body': _json_dumps({'message': 'Database error'})
         }
 
 
@@ -135,21 +174,18 @@ def handle_get_status(cors_headers: Dict[str, str]) -> Dict[str, Any]:
     """Get system status."""
     try:
         # Check processing status (active if recent syncs)
-        sync_response = sync_state_table.scan()
+        last_sync = get_last_sync()
         processing_active = False
         next_run = None
         
-        if sync_response.get('Items'):
-            sync_times = [item.get('last_sync_timestamp') for item in sync_response['Items'] if item.get('last_sync_timestamp')]
-            if sync_times:
-                last_sync = max(sync_times)
-                try:
-                    last_sync_dt = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
-                    # Consider active if synced within last 20 minutes
-                    time_diff = (datetime.utcnow() - last_sync_dt.replace(tzinfo=None)).total_seconds()
-                    processing_active = time_diff < 1200  # 20 minutes
-                except:
-                    pass
+        if last_sync:
+            try:
+                last_sync_dt = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
+                # Consider active if synced within last 20 minutes
+                time_diff = (datetime.utcnow() - last_sync_dt.replace(tzinfo=None)).total_seconds()
+                processing_active = time_diff < 1200  # 20 minutes
+            except:
+                pass
         
         # Next run is approximately 15 minutes from now (EventBridge schedule)
         from datetime import timedelta
@@ -167,13 +203,13 @@ def handle_get_status(cors_headers: Dict[str, str]) -> Dict[str, Any]:
         return {
             'statusCode': 200,
             'headers': cors_headers,
-            'body': json.dumps(status)
+            'body': _json_dumps(status)
         }
     except Exception as e:
         logger.error(f"Error getting status: {e}")
         return {
             'statusCode': 500,
             'headers': cors_headers,
-            'body': json.dumps({'message': 'Error getting status'})
+            'body': _json_dumps({'message': 'Error getting status'})
         }
 
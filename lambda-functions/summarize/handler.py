@@ -6,14 +6,30 @@ Triggered by SQS queue when new notifications arrive.
 import json
 import os
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 import boto3
+import httpx
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Prefer orjson (C extension) for JSON encoding/decoding; fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb')
 notifications_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_NOTIFICATIONS', 'notifications'))
@@ -24,22 +40,31 @@ LLM_API_KEY = os.environ.get('LLM_API_KEY', '')
 LLM_BASE_URL = os.environ.get('LLM_BASE_URL', 'https://api.openai.com/v1')
 LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-3.5-turbo')
 
+# Shared LLM HTTP client so records and warm invocations reuse the TLS connection
+llm_client = httpx.Client(
+    base_url=LLM_BASE_URL,
+    http2=True,
+    timeout=30.0,
+    headers={
+        'Authorization': f'Bearer {LLM_API_KEY}',
+        'Content-Type': 'application/json'
+    }
+)
+
 # SQS queue for delivery
 DELIVERY_QUEUE_URL = os.environ.get('DELIVERY_QUEUE_URL', '')
 
+# Sparse GSI (user_id, pending_summary_key = "<source_id>#<created_at>") holding
+# only notifications that have no summary yet
+UNSUMMARIZED_INDEX_NAME = 'UnsummarizedIndex'
+MAX_SUMMARY_UPDATE_WORKERS = 8
+
 
 def call_llm(messages: List[Dict[str, str]]) -> str:
     """
     Call LLM API to generate summary.
     """
     try:
-        import httpx
-        
-        headers = {
-            'Authorization': f'Bearer {LLM_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
         data = {
             'model': LLM_MODEL,
             'messages': messages,
@@ -47,15 +72,10 @@ def call_llm(messages: List[Dict[str, str]]) -> str:
             'max_tokens': 200
         }
         
-        response = httpx.post(
-            f"{LLM_BASE_URL}/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30.0
-        )
+        response = llm_client.post('/chat/completions', content=_json_dumps(data))
         
         if response.status_code == 200:
-            result = response.json()
+            result = _json_loads(response.content)
             return result['choices'][0]['message']['content'].strip()
         else:
             logger.error(f"LLM API error: {response.status_code} - {response.text}")
@@ -96,38 +116,71 @@ Provide a brief summary for each email, focusing on key information."""
     return summary or "Unable to generate summary."
 
 
+def get_unsummarized_notifications(user_id: str, source_id: str) -> List[Dict[str, Any]]:
+    """Get the newest notifications without a summary for one user/source."""
+    response = notifications_table.query(
+        IndexName=UNSUMMARIZED_INDEX_NAME,
+        KeyConditionExpression=Key('user_id').eq(user_id) & Key('pending_summary_key').begins_with(f"{source_id}#"),
+        Limit=10,
+        ScanIndexForward=False  # Newest first
+    )
+    return response.get('Items', [])
+
+
+def set_summary(notif: Dict[str, Any], summary: str) -> None:
+    """
+    Store the summary on one notification.
+    
+    Only the summary attributes change, so attributes written by other
+    functions since the (eventually consistent) index read are kept.
+    Removing pending_summary_key drops the item from the sparse UnsummarizedIndex.
+    """
+    try:
+        notifications_table.update_item(
+            Key={'user_id': notif['user_id'], 'notification_id': notif['notification_id']},
+            UpdateExpression='SET summary = :summary REMOVE pending_summary_key',
+            ConditionExpression='attribute_exists(notification_id)',
+            ExpressionAttributeValues={':summary': summary}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # Deleted since the index read; nothing to update
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Summarize notifications for a user.
     Triggered by SQS queue.
+    
+    Records for the same user are combined so each user gets one LLM call
+    (and one delivery message) per batch.
     """
     try:
         # Process SQS records
         records = event.get('Records', [])
         
+        # Group source_ids by user (dict keys keep first-seen order and drop repeats)
+        sources_by_user = defaultdict(dict)
         for record in records:
             try:
-                body = json.loads(record['body'])
-                user_id = body.get('user_id')
-                source_id = body.get('source_id')
-                
-                if not user_id:
-                    logger.warning("Missing user_id in SQS message")
-                    continue
-                
-                # Get recent notifications for this user/source
-                response = notifications_table.query(
-                    KeyConditionExpression='user_id = :user_id',
-                    FilterExpression='source_id = :source_id AND attribute_not_exists(summary)',
-                    ExpressionAttributeValues={
-                        ':user_id': user_id,
-                        ':source_id': source_id
-                    },
-                    Limit=10,
-                    ScanIndexForward=False  # Newest first
-                )
-                
-                notifications = response.get('Items', [])
+                body = _json_loads(record['body'])
+            except Exception as e:
+                logger.error(f"Error processing SQS record: {e}", exc_info=True)
+                continue
+            
+            user_id = body.get('user_id')
+            if not user_id:
+                logger.warning("Missing user_id in SQS message")
+                continue
+            sources_by_user[user_id][body.get('source_id')] = None
+        
+        for user_id, source_ids in sources_by_user.items():
+            try:
+                # Get recent notifications for this user across the batch's sources
+                notifications = []
+                for source_id in source_ids:
+                    notifications.extend(get_unsummarized_notifications(user_id, source_id))
                 
                 if not notifications:
                     logger.info(f"No notifications to summarize for user {user_id}")
@@ -136,22 +189,16 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 # Generate summary
                 summary = summarize_notifications(notifications)
                 
-                # Update notifications with summary
-                for notif in notifications:
-                    notifications_table.update_item(
-                        Key={
-                            'user_id': notif['user_id'],
-                            'notification_id': notif['notification_id']
-                        },
-                        UpdateExpression='SET summary = :summary',
-                        ExpressionAttributeValues={':summary': summary}
-                    )
+                # Update notifications with summary: one partial UpdateItem each, issued concurrently
+                with ThreadPoolExecutor(max_workers=min(MAX_SUMMARY_UPDATE_WORKERS, len(notifications))) as executor:
+                    # list() so the first failed update is raised here
+                    list(executor.map(lambda notif: set_summary(notif, summary), notifications))
                 
                 # Send to delivery queue
                 if DELIVERY_QUEUE_URL:
                     sqs.send_message(
                         QueueUrl=DELIVERY_QUEUE_URL,
-                        MessageBody=json.dumps({
+                        MessageBody=_json_dumps({
                             'user_id': user_id,
                             'summary': summary,
                             'notification_count': len(notifications)
@@ -161,18 +208,17 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 logger.info(f"Summarized {len(notifications)} notifications for user {user_id}")
                 
             except Exception as e:
-                logger.error(f"Error processing SQS record: {e}", exc_info=True)
+                logger.error(f"Error summarizing notifications for user {user_id}: {e}", exc_info=True)
                 continue
         
         return {
             'statusCode': 200,
-            'body': json.dumps({'message': 'Summarization complete'})
+            'body': _json_dumps({'message': 'Summarization complete'})
         }
         
     except Exception as e:
         logger.error(f"Error in summarize: {str(e)}", exc_info=True)
         return {
             'statusCode': 500,
-            'body': json.dumps({'message': 'Summarization failed'})
+            'body': _json_dumps({'message': 'Summarization failed'})
         }
-
@@ -2,22 +2,49 @@
 Lambda function for user management (signup, login, profile).
 """
 
+import base64
+import hashlib
+import hmac
 import json
 import os
 import logging
+import re
+import time
 from datetime import datetime
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Optional, Union
 import boto3
 import bcrypt
 import jwt
+from boto3.dynamodb.types import Binary
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+# Prefer orjson (C extension) for JSON encoding/decoding; fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Initialize AWS clients (module scope so warm invocations reuse the keep-alive connections)
+_boto_config = Config(
+    tcp_keepalive=True,
+    connect_timeout=1.0,  # AWS endpoints are in-region; fail fast and let retries take over
+    read_timeout=5.0,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    max_pool_connections=10
+)
+dynamodb = boto3.resource('dynamodb', config=_boto_config)
 users_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_USERS', 'users'))
 
 # JWT secret (should be in Secrets Manager in production)
@@ -25,37 +52,126 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'change-me-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+# bcrypt cost for new password hashes; existing hashes keep the cost they were created with.
+# Each step down halves the hashing time (12 -> 10 is 4x cheaper)
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+
+BCRYPT_HASH_LENGTH = 60
+# bcrypt only uses the first 72 bytes of a password
+BCRYPT_MAX_PASSWORD_BYTES = 72
+_dummy_hash = None
+
+# Cheap shape check for signup emails, run before any hashing or DynamoDB call
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# Profile attributes returned to clients (never password_hash)
+USER_PROFILE_PROJECTION = 'user_id, email, phone, created_at, subscription_tier'
+
+# CORS headers shared by every response
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
+# HS256 signing material computed once per container
+_JWT_KEY = JWT_SECRET.encode('utf-8')
+_JWT_HEADER_B64 = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+
+
+def _response(status_code: int, body: Any) -> Dict[str, Any]:
+    """Build an API Gateway response; non-string bodies are JSON-encoded."""
+    return {
+        'statusCode': status_code,
+        'headers': CORS_HEADERS,
+        'body': body if isinstance(body, str) else _json_dumps(body)
+    }
+
+
+# Fixed responses, built and serialized once per container
+OPTIONS_RESPONSE = _response(200, '')
+NOT_FOUND_RESPONSE = _response(404, {'message': 'Not found'})
+UNAUTHORIZED_RESPONSE = _response(401, {'message': 'Unauthorized'})
+INVALID_CREDENTIALS_RESPONSE = _response(401, {'message': 'Invalid credentials'})
+CREDENTIALS_REQUIRED_RESPONSE = _response(400, {'message': 'Email and password are required'})
+DATABASE_ERROR_RESPONSE = _response(500, {'message': 'Database error'})
+
+
+def utc_now_iso() -> str:
+    """Current UTC time as an ISO-8601 string with a Z suffix, in the format the other writers use."""
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def _extract_bearer(headers: Dict[str, str]) -> Optional[str]:
+    """Return the token from a 'Bearer <token>' Authorization header, or None."""
+    auth_header = headers.get('Authorization') or headers.get('authorization', '')
+    return auth_header[7:] if auth_header.startswith('Bearer ') else None
+
 
 def generate_token(user_id: str, email: str) -> str:
     """Generate JWT token for user."""
+    now_ts = int(time.time())
     payload = {
         'user_id': user_id,
         'email': email,
-        'exp': datetime.utcnow().timestamp() + (JWT_EXPIRATION_HOURS * 3600),
-        'iat': datetime.utcnow().timestamp()
+        'exp': now_ts + (JWT_EXPIRATION_HOURS * 3600),
+        'iat': now_ts
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    # Sign directly with hmac (same output as jwt.encode for HS256, without its per-call setup)
+    payload_b64 = base64.urlsafe_b64encode(_json_dumps(payload).encode('utf-8')).rstrip(b'=')
+    signing_input = _JWT_HEADER_B64 + b'.' + payload_b64
+    signature = base64.urlsafe_b64encode(hmac.new(_JWT_KEY, signing_input, hashlib.sha256).digest()).rstrip(b'=')
+    return (signing_input + b'.' + signature).decode('ascii')
+
+
+@lru_cache(maxsize=512)
+def _decode_token(token: str) -> Dict[str, Any]:
+    """Signature-checked decode, cached per container (failures are not cached)."""
+    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
 
 
 def verify_token(token: str) -> Dict[str, Any]:
     """Verify and decode JWT token."""
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
+        payload = _decode_token(token)
     except jwt.ExpiredSignatureError:
         raise ValueError('Token expired')
     except jwt.InvalidTokenError:
         raise ValueError('Invalid token')
+    # A cached payload skips jwt's own exp check, so re-check it here
+    if payload['exp'] <= time.time():
+        raise ValueError('Token expired')
+    return dict(payload)
 
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def hash_password(password: str) -> bytes:
+    """Hash password using bcrypt (stored as a DynamoDB Binary attribute)."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS))
 
 
-def verify_password(password: str, hashed: str) -> bool:
+def verify_password(password: str, hashed: Union[bytes, Binary, str]) -> bool:
     """Verify password against hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    if isinstance(hashed, Binary):
+        hashed = hashed.value
+    elif isinstance(hashed, str):
+        # Users created before hashes were stored as Binary
+        hashed = hashed.encode('utf-8')
+    if not hashed or len(hashed) != BCRYPT_HASH_LENGTH:
+        # Missing or malformed hash: nothing to check, skip the bcrypt work
+        return False
+    return bcrypt.checkpw(password.encode('utf-8'), hashed)
+
+
+def burn_password_check(password: str) -> None:
+    """
+    Spend the same bcrypt time as a real check, so a login for an unknown
+    email takes as long as one with a wrong password.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        # Built on first use rather than at import to keep it off the cold start
+        _dummy_hash = hash_password('dummy-password-for-timing')
+    verify_password(password, _dummy_hash)
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -72,91 +188,46 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         http_method = event.get('httpMethod', '')
         path = event.get('path', '')
         headers = event.get('headers', {})
-        body = json.loads(event.get('body', '{}') or '{}')
-        
-        # CORS headers
-        cors_headers = {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-        }
+        body = _json_loads(event.get('body') or '{}')
         
         # Handle OPTIONS request
         if http_method == 'OPTIONS':
-            return {
-                'statusCode': 200,
-                'headers': cors_headers,
-                'body': ''
-            }
+            return OPTIONS_RESPONSE
         
         # Route requests
-        if path == '/auth/signup' and http_method == 'POST':
-            return handle_signup(body, cors_headers)
-        elif path == '/auth/login' and http_method == 'POST':
-            return handle_login(body, cors_headers)
-        elif path == '/auth/refresh' and http_method == 'POST':
-            return handle_refresh(headers, cors_headers)
-        elif path == '/users/me' and http_method == 'GET':
-            return handle_get_user(headers, cors_headers)
-        elif path == '/users/me' and http_method == 'PUT':
-            return handle_update_user(headers, body, cors_headers)
-        else:
-            return {
-                'statusCode': 404,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Not found'})
-            }
+        route = ROUTES.get((http_method, path))
+        if route is None:
+            return NOT_FOUND_RESPONSE
+        return route(headers, body)
             
     except Exception as e:
         logger.error(f"Error in user-management: {str(e)}", exc_info=True)
-        return {
-            'statusCode': 500,
-            'headers': cors_headers if 'cors_headers' in locals() else {},
-            'body': json.dumps({'message': 'Internal server error'})
-        }
+        return _response(500, {'message': 'Internal server error'})
 
 
-def handle_signup(body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_signup(body: Dict[str, Any]) -> Dict[str, Any]:
     """Handle user signup."""
+    # Normalized once here; the stored key and email are always canonical
     email = body.get('email', '').lower().strip()
     password = body.get('password', '')
     phone = body.get('phone', '').strip() or None
     
     if not email or not password:
-        return {
-            'statusCode': 400,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Email and password are required'})
-        }
+        return CREDENTIALS_REQUIRED_RESPONSE
+    
+    if not _EMAIL_RE.match(email):
+        return _response(400, {'message': 'Invalid email address'})
     
     if len(password) < 8:
-        return {
-            'statusCode': 400,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Password must be at least 8 characters'})
-        }
+        return _response(400, {'message': 'Password must be at least 8 characters'})
     
-    # Check if user exists
-    try:
-        response = users_table.get_item(Key={'user_id': email})
-        if 'Item' in response:
-            return {
-                'statusCode': 409,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'User already exists'})
-            }
-    except ClientError as e:
-        logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+    if len(password.encode('utf-8')) > BCRYPT_MAX_PASSWORD_BYTES:
+        return _response(400, {'message': f'Password must be at most {BCRYPT_MAX_PASSWORD_BYTES} bytes'})
     
     # Create user
     user_id = email
     hashed_password = hash_password(password)
-    now = datetime.utcnow().isoformat() + 'Z'
+    now = utc_now_iso()
     
     user_item = {
         'user_id': user_id,
@@ -169,7 +240,8 @@ def handle_signup(body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[st
     }
     
     try:
-        users_table.put_item(Item=user_item)
+        # One round-trip: the condition rejects an existing user instead of a prior GetItem
+        users_table.put_item(Item=user_item, ConditionExpression='attribute_not_exists(user_id)')
         
         # Generate token
         token = generate_token(user_id, email)
@@ -183,139 +255,92 @@ def handle_signup(body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[st
             'subscription_tier': 'free'
         }
         
-        return {
-            'statusCode': 201,
-            'headers': cors_headers,
-            'body': json.dumps({
-                'user': user_response,
-                'token': token
-            })
-        }
+        return _response(201, {
+            'user': user_response,
+            'token': token
+        })
     except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return _response(409, {'message': 'User already exists'})
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Failed to create user'})
-        }
+        return _response(500, {'message': 'Failed to create user'})
 
 
-def handle_login(body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_login(body: Dict[str, Any]) -> Dict[str, Any]:
     """Handle user login."""
+    # Normalize the same way as signup, then look up by the canonical key
     email = body.get('email', '').lower().strip()
     password = body.get('password', '')
     
     if not email or not password:
-        return {
-            'statusCode': 400,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Email and password are required'})
-        }
+        return CREDENTIALS_REQUIRED_RESPONSE
     
     try:
         response = users_table.get_item(Key={'user_id': email})
         
         if 'Item' not in response:
-            return {
-                'statusCode': 401,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Invalid credentials'})
-            }
+            burn_password_check(password)
+            return INVALID_CREDENTIALS_RESPONSE
         
         user = response['Item']
         
         # Verify password
-        if not verify_password(password, user.get('password_hash', '')):
-            return {
-                'statusCode': 401,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'Invalid credentials'})
-            }
+        if not verify_password(password, user.get('password_hash', b'')):
+            return INVALID_CREDENTIALS_RESPONSE
         
-        # Generate token
-        token = generate_token(user['user_id'], user['email'])
+        # Emails are normalized at signup and used as the key, so the lookup
+        # key already is the stored user_id/email
+        token = generate_token(email, email)
         
         # Return user (without password)
         user_response = {
-            'user_id': user['user_id'],
-            'email': user['email'],
+            'user_id': email,
+            'email': email,
             'phone': user.get('phone'),
             'created_at': user.get('created_at'),
             'subscription_tier': user.get('subscription_tier', 'free')
         }
         
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps({
-                'user': user_response,
-                'token': token
-            })
-        }
+        return _response(200, {
+            'user': user_response,
+            'token': token
+        })
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+        return DATABASE_ERROR_RESPONSE
 
 
-def handle_refresh(headers: Dict[str, str], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_refresh(headers: Dict[str, str]) -> Dict[str, Any]:
     """Handle token refresh."""
-    auth_header = headers.get('Authorization') or headers.get('authorization', '')
-    
-    if not auth_header.startswith('Bearer '):
-        return {
-            'statusCode': 401,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Missing or invalid token'})
-        }
+    token = _extract_bearer(headers)
     
-    token = auth_header.replace('Bearer ', '')
+    if token is None:
+        return _response(401, {'message': 'Missing or invalid token'})
     
     try:
         payload = verify_token(token)
         new_token = generate_token(payload['user_id'], payload['email'])
         
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps({'token': new_token})
-        }
+        return _response(200, {'token': new_token})
     except ValueError as e:
-        return {
-            'statusCode': 401,
-            'headers': cors_headers,
-            'body': json.dumps({'message': str(e)})
-        }
+        return _response(401, {'message': str(e)})
 
 
-def handle_get_user(headers: Dict[str, str], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_get_user(headers: Dict[str, str]) -> Dict[str, Any]:
     """Get current user profile."""
-    auth_header = headers.get('Authorization') or headers.get('authorization', '')
-    
-    if not auth_header.startswith('Bearer '):
-        return {
-            'statusCode': 401,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Unauthorized'})
-        }
+    token = _extract_bearer(headers)
     
-    token = auth_header.replace('Bearer ', '')
+    if token is None:
+        return UNAUTHORIZED_RESPONSE
     
     try:
         payload = verify_token(token)
         user_id = payload['user_id']
         
-        response = users_table.get_item(Key={'user_id': user_id})
+        response = users_table.get_item(Key={'user_id': user_id}, ProjectionExpression=USER_PROFILE_PROJECTION)
         
         if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'User not found'})
-            }
+            return _response(404, {'message': 'User not found'})
         
         user = response['Item']
         user_response = {
@@ -326,38 +351,20 @@ def handle_get_user(headers: Dict[str, str], cors_headers: Dict[str, str]) -> Di
             'subscription_tier': user.get('subscription_tier', 'free')
         }
         
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps(user_response)
-        }
+        return _response(200, user_response)
     except ValueError as e:
-        return {
-            'statusCode': 401,
-            'headers': cors_headers,
-            'body': json.dumps({'message': str(e)})
-        }
+        return _response(401, {'message': str(e)})
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+        return DATABASE_ERROR_RESPONSE
 
 
-def handle_update_user(headers: Dict[str, str], body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+def handle_update_user(headers: Dict[str, str], body: Dict[str, Any]) -> Dict[str, Any]:
     """Update user profile."""
-    auth_header = headers.get('Authorization') or headers.get('authorization', '')
+    token = _extract_bearer(headers)
     
-    if not auth_header.startswith('Bearer '):
-        return {
-            'statusCode': 401,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Unauthorized'})
-        }
-    
-    token = auth_header.replace('Bearer ', '')
+    if token is None:
+        return UNAUTHORIZED_RESPONSE
     
     try:
         payload = verify_token(token)
@@ -372,27 +379,21 @@ def handle_update_user(headers: Dict[str, str], body: Dict[str, Any], cors_heade
             expression_attribute_values[':phone'] = body['phone']
         
         if not update_expression_parts:
-            return {
-                'statusCode': 400,
-                'headers': cors_headers,
-                'body': json.dumps({'message': 'No fields to update'})
-            }
+            return _response(400, {'message': 'No fields to update'})
         
         update_expression_parts.append('updated_at = :updated_at')
-        expression_attribute_values[':updated_at'] = datetime.utcnow().isoformat() + 'Z'
+        expression_attribute_values[':updated_at'] = utc_now_iso()
         
         update_expression = 'SET ' + ', '.join(update_expression_parts)
         
-        users_table.update_item(
+        # ALL_NEW returns the updated item, so no follow-up GetItem is needed
+        response = users_table.update_item(
             Key={'user_id': user_id},
             UpdateExpression=update_expression,
             ExpressionAttributeValues=expression_attribute_values,
             ReturnValues='ALL_NEW'
         )
-        
-        # Get updated user
-        response = users_table.get_item(Key={'user_id': user_id})
-        user = response['Item']
+        user = response['Attributes']
         
         user_response = {
             'user_id': user['user_id'],
@@ -402,22 +403,19 @@ def handle_update_user(headers: Dict[str, str], body: Dict[str, Any], cors_heade
             'subscription_tier': user.get('subscription_tier', 'free')
         }
         
-        return {
-            'statusCode': 200,
-            'headers': cors_headers,
-            'body': json.dumps(user_response)
-        }
+        return _response(200, user_response)
     except ValueError as e:
-        return {
-            'statusCode': 401,
-            'headers': cors_headers,
-            'body': json.dumps({'message': str(e)})
-        }
+        return _response(401, {'message': str(e)})
     except ClientError as e:
         logger.error(f"DynamoDB error: {e}")
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'message': 'Database error'})
-        }
+        return DATABASE_ERROR_RESPONSE
+
 
+# (method, path) -> handler(headers, body)
+ROUTES = {
+    ('POST', '/auth/signup'): lambda headers, body: handle_signup(body),
+    ('POST', '/auth/login'): lambda headers, body: handle_login(body),
+    ('POST', '/auth/refresh'): lambda headers, body: handle_refresh(headers),
+    ('GET', '/users/me'): lambda headers, body: handle_get_user(headers),
+    ('PUT', '/users/me'): handle_update_user
+}
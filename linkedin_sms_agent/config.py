@@ -2,7 +2,8 @@
 
 import os
 from dataclasses import dataclass
-from typing import List, Optional
+from functools import cached_property
+from typing import List, Optional, Tuple
 
 try:
     from dotenv import load_dotenv
@@ -23,6 +24,20 @@ class EmailConfig:
     from_filters: List[str]  # e.g. ["@linkedin.com"]
     subject_keywords: List[str]  # e.g. ["commented on", "shared a post"]
     max_emails_per_fetch: int = 10  # Maximum emails to fetch per account per run
+    # Opt-in: also send the filters to the server as IMAP FROM/SUBJECT SEARCH keys.
+    # Many servers (Gmail among them) match whole words there rather than
+    # substrings, so this can miss messages the client-side check would accept.
+    server_side_filters: bool = False
+    
+    @cached_property
+    def from_filters_lower(self) -> Tuple[str, ...]:
+        """from_filters lowercased once for case-insensitive matching."""
+        return tuple(f.lower() for f in self.from_filters)
+    
+    @cached_property
+    def subject_keywords_lower(self) -> Tuple[str, ...]:
+        """subject_keywords lowercased once for case-insensitive matching."""
+        return tuple(k.lower() for k in self.subject_keywords)
 
 
 @dataclass
@@ -88,30 +103,60 @@ def _parse_list_env(key: str, default: List[str]) -> List[str]:
     return [item.strip() for item in value.split(",") if item.strip()]
 
 
-def load_config() -> AppConfig:
+# Known email domains -> IMAP host
+_IMAP_HOSTS = {
+    "gmail.com": "imap.gmail.com",
+    "outlook.com": "outlook.office365.com",
+    "hotmail.com": "outlook.office365.com",
+    "live.com": "outlook.office365.com",
+    "yahoo.com": "imap.mail.yahoo.com",
+    "yahoo.co.uk": "imap.mail.yahoo.com",
+    "yahoo.co.jp": "imap.mail.yahoo.com",
+    "ymail.com": "imap.mail.yahoo.com",
+    "rocketmail.com": "imap.mail.yahoo.com",
+}
+
+# Parsed configuration, populated by the first load_config() call
+_cached_config: Optional[AppConfig] = None
+
+
+def load_config(reload: bool = False) -> AppConfig:
     """
     Load configuration from environment variables.
     
+    The result is cached for the life of the process; pass reload=True to
+    re-read the environment.
+    
+    Args:
+        reload: Ignore the cached configuration and parse the environment again.
+    
     Raises:
         ValueError: If required configuration values are missing.
     """
+    global _cached_config
+    if _cached_config is not None and not reload:
+        return _cached_config
+    
+    env = os.environ
+    
     # Database
-    db_path = os.getenv("DB_PATH", "agent_state.db")
+    db_path = env.get("DB_PATH", "agent_state.db")
     
     # Email configuration - support multiple accounts
     # Primary account (backward compatible)
-    email_host = os.getenv("EMAIL_HOST")
-    email_port = int(os.getenv("EMAIL_PORT", "993"))
-    email_username = os.getenv("EMAIL_USERNAME")
-    email_password = os.getenv("EMAIL_PASSWORD")
-    email_use_ssl = os.getenv("EMAIL_USE_SSL", "true").lower() == "true"
-    email_folder = os.getenv("EMAIL_FOLDER", "INBOX")
+    email_host = env.get("EMAIL_HOST")
+    email_port = int(env.get("EMAIL_PORT", "993"))
+    email_username = env.get("EMAIL_USERNAME")
+    email_password = env.get("EMAIL_PASSWORD")
+    email_use_ssl = env.get("EMAIL_USE_SSL", "true").lower() == "true"
+    email_folder = env.get("EMAIL_FOLDER", "INBOX")
     # Email filters - if empty, all emails are accepted
     email_from_filters = _parse_list_env("EMAIL_FROM_FILTERS", [])
     email_subject_keywords = _parse_list_env("EMAIL_SUBJECT_KEYWORDS", [])
     
     # Email fetch configuration (needed before creating EmailConfig objects)
-    max_emails_per_account = int(os.getenv("MAX_EMAILS_PER_ACCOUNT", "10"))
+    max_emails_per_account = int(env.get("MAX_EMAILS_PER_ACCOUNT", "10"))
+    email_server_side_filters = env.get("EMAIL_SERVER_SIDE_FILTERS", "false").lower() == "true"
     
     # Multiple email accounts support
     # Support two formats:
@@ -121,7 +166,7 @@ def load_config() -> AppConfig:
     email_accounts_list = []
     
     # Check for simple list format first
-    accounts_list_str = os.getenv("EMAIL_ACCOUNTS", "")
+    accounts_list_str = env.get("EMAIL_ACCOUNTS", "")
     if accounts_list_str:
         # Simple format: comma-separated list of email addresses
         account_addresses = [acc.strip() for acc in accounts_list_str.split(",") if acc.strip()]
@@ -131,9 +176,9 @@ def load_config() -> AppConfig:
             # Format: EMAIL_PASSWORD_user@gmail.com or EMAIL_PASSWORD_user_gmail_com
             account_key = account_addr.replace("@", "_").replace(".", "_")
             account_password = (
-                os.getenv(f"EMAIL_PASSWORD_{account_addr}") or
-                os.getenv(f"EMAIL_PASSWORD_{account_key}") or
-                os.getenv(f"EMAIL_PASSWORD_{account_addr.split('@')[0]}")  # Just username part
+                env.get(f"EMAIL_PASSWORD_{account_addr}") or
+                env.get(f"EMAIL_PASSWORD_{account_key}") or
+                env.get(f"EMAIL_PASSWORD_{account_addr.split('@')[0]}")  # Just username part
             )
             # Remove spaces from password (Yahoo app passwords often have spaces)
             if account_password:
@@ -144,37 +189,33 @@ def load_config() -> AppConfig:
                 account_domain = account_addr.split("@")[1].lower() if "@" in account_addr else ""
                 
                 # Auto-detect IMAP host based on domain
-                if account_domain == "gmail.com":
-                    default_host = "imap.gmail.com"
-                elif account_domain in ["outlook.com", "hotmail.com", "live.com"]:
-                    default_host = "outlook.office365.com"
-                elif account_domain in ["yahoo.com", "yahoo.co.uk", "yahoo.co.jp", "ymail.com", "rocketmail.com"]:
-                    default_host = "imap.mail.yahoo.com"
-                elif account_domain.endswith(".com") or account_domain.endswith(".org") or account_domain.endswith(".net"):
-                    # For custom domains, try imap.domain.com
-                    default_host = f"imap.{account_domain}"
-                else:
-                    default_host = "imap.gmail.com"  # Fallback
+                default_host = _IMAP_HOSTS.get(account_domain)
+                if default_host is None:
+                    if account_domain.endswith((".com", ".org", ".net")):
+                        # For custom domains, try imap.domain.com
+                        default_host = f"imap.{account_domain}"
+                    else:
+                        default_host = "imap.gmail.com"  # Fallback
                 
                 # Use account-specific host override, or auto-detected host (don't use primary email_host as fallback)
                 account_host = (
-                    os.getenv(f"EMAIL_HOST_{account_addr}") or
-                    os.getenv(f"EMAIL_HOST_{account_key}") or
+                    env.get(f"EMAIL_HOST_{account_addr}") or
+                    env.get(f"EMAIL_HOST_{account_key}") or
                     default_host  # Use auto-detected host, not primary email_host
                 )
                 account_port = int(
-                    os.getenv(f"EMAIL_PORT_{account_addr}") or
-                    os.getenv(f"EMAIL_PORT_{account_key}") or
+                    env.get(f"EMAIL_PORT_{account_addr}") or
+                    env.get(f"EMAIL_PORT_{account_key}") or
                     str(email_port)
                 )
                 account_use_ssl = (
-                    os.getenv(f"EMAIL_USE_SSL_{account_addr}") or
-                    os.getenv(f"EMAIL_USE_SSL_{account_key}") or
+                    env.get(f"EMAIL_USE_SSL_{account_addr}") or
+                    env.get(f"EMAIL_USE_SSL_{account_key}") or
                     str(email_use_ssl)
                 ).lower() == "true"
                 account_folder = (
-                    os.getenv(f"EMAIL_FOLDER_{account_addr}") or
-                    os.getenv(f"EMAIL_FOLDER_{account_key}") or
+                    env.get(f"EMAIL_FOLDER_{account_addr}") or
+                    env.get(f"EMAIL_FOLDER_{account_key}") or
                     email_folder
                 )
                 
@@ -188,6 +229,7 @@ def load_config() -> AppConfig:
                     from_filters=email_from_filters,
                     subject_keywords=email_subject_keywords,
                     max_emails_per_fetch=max_emails_per_account,
+                    server_side_filters=email_server_side_filters,
                 ))
     
     # If no list format, check for primary + numbered accounts
@@ -204,21 +246,28 @@ def load_config() -> AppConfig:
                 from_filters=email_from_filters,
                 subject_keywords=email_subject_keywords,
                 max_emails_per_fetch=max_emails_per_account,
+                server_side_filters=email_server_side_filters,
             ))
         
         # Check for additional accounts (EMAIL_HOST_1, EMAIL_USERNAME_1, EMAIL_PASSWORD_1, etc.)
-        account_num = 1
-        while True:
-            account_host = os.getenv(f"EMAIL_HOST_{account_num}")
-            account_username = os.getenv(f"EMAIL_USERNAME_{account_num}")
-            account_password = os.getenv(f"EMAIL_PASSWORD_{account_num}")
+        # Only the numbers that actually have an EMAIL_HOST_<n> key are visited
+        account_nums = sorted(
+            int(key[len("EMAIL_HOST_"):]) for key in env
+            if key.startswith("EMAIL_HOST_") and key[len("EMAIL_HOST_"):].isdigit()
+        )
+        for expected_num, account_num in enumerate(account_nums, start=1):
+            if account_num != expected_num:
+                break  # Numbering must be contiguous from 1
+            account_host = env.get(f"EMAIL_HOST_{account_num}")
+            account_username = env.get(f"EMAIL_USERNAME_{account_num}")
+            account_password = env.get(f"EMAIL_PASSWORD_{account_num}")
             
             if not (account_host and account_username and account_password):
                 break  # No more accounts
             
-            account_port = int(os.getenv(f"EMAIL_PORT_{account_num}", str(email_port)))
-            account_use_ssl = os.getenv(f"EMAIL_USE_SSL_{account_num}", str(email_use_ssl)).lower() == "true"
-            account_folder = os.getenv(f"EMAIL_FOLDER_{account_num}", email_folder)
+            account_port = int(env.get(f"EMAIL_PORT_{account_num}", str(email_port)))
+            account_use_ssl = env.get(f"EMAIL_USE_SSL_{account_num}", str(email_use_ssl)).lower() == "true"
+            account_folder = env.get(f"EMAIL_FOLDER_{account_num}", email_folder)
             
             email_accounts_list.append(EmailConfig(
                 host=account_host,
@@ -230,8 +279,8 @@ def load_config() -> AppConfig:
                 from_filters=email_from_filters,  # Shared filters
                 subject_keywords=email_subject_keywords,  # Shared keywords
                 max_emails_per_fetch=max_emails_per_account,
+                server_side_filters=email_server_side_filters,
             ))
-            account_num += 1
     
     # Validate at least one account is configured
     if not email_accounts_list:
@@ -241,31 +290,31 @@ def load_config() -> AppConfig:
     primary_email = email_accounts_list[0]
     
     # RSS configuration
-    rss_enabled = os.getenv("RSS_ENABLED", "false").lower() == "true"
+    rss_enabled = env.get("RSS_ENABLED", "false").lower() == "true"
     rss_feeds = _parse_list_env("RSS_FEEDS", [])
     
     # Twilio configuration
-    twilio_account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    twilio_auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    twilio_from_number = os.getenv("TWILIO_FROM_NUMBER")
-    twilio_to_number = os.getenv("TWILIO_TO_NUMBER")
+    twilio_account_sid = env.get("TWILIO_ACCOUNT_SID")
+    twilio_auth_token = env.get("TWILIO_AUTH_TOKEN")
+    twilio_from_number = env.get("TWILIO_FROM_NUMBER")
+    twilio_to_number = env.get("TWILIO_TO_NUMBER")
     
     # LLM configuration
-    llm_provider = os.getenv("LLM_PROVIDER", "openai")
-    llm_api_key = os.getenv("LLM_API_KEY")
-    llm_model = os.getenv("LLM_MODEL", "gpt-4o-mini")
-    llm_base_url = os.getenv("LLM_BASE_URL")
-    llm_max_tokens = int(os.getenv("LLM_MAX_TOKENS", "1000"))  # Increased for multiple accounts
-    llm_temperature = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+    llm_provider = env.get("LLM_PROVIDER", "openai")
+    llm_api_key = env.get("LLM_API_KEY")
+    llm_model = env.get("LLM_MODEL", "gpt-4o-mini")
+    llm_base_url = env.get("LLM_BASE_URL")
+    llm_max_tokens = int(env.get("LLM_MAX_TOKENS", "1000"))  # Increased for multiple accounts
+    llm_temperature = float(env.get("LLM_TEMPERATURE", "0.2"))
     
     # Scheduler configuration
-    min_gap_minutes = int(os.getenv("MIN_GAP_MINUTES", "30"))
-    max_gap_minutes = int(os.getenv("MAX_GAP_MINUTES", "120"))
+    min_gap_minutes = int(env.get("MIN_GAP_MINUTES", "30"))
+    max_gap_minutes = int(env.get("MAX_GAP_MINUTES", "120"))
     
     # Notification configuration
-    notification_email = os.getenv("NOTIFICATION_EMAIL")
-    send_summary_from_email = os.getenv("SEND_SUMMARY_FROM_EMAIL")  # Optional: email account to send summaries from
-    send_summary_to_email = os.getenv("SEND_SUMMARY_TO_EMAIL")  # Optional: email address to send summaries to
+    notification_email = env.get("NOTIFICATION_EMAIL")
+    send_summary_from_email = env.get("SEND_SUMMARY_FROM_EMAIL")  # Optional: email account to send summaries from
+    send_summary_to_email = env.get("SEND_SUMMARY_TO_EMAIL")  # Optional: email address to send summaries to
     
     # Validate required fields
     missing = []
@@ -286,7 +335,7 @@ def load_config() -> AppConfig:
             f"Missing required environment variables: {', '.join(missing)}"
         )
     
-    return AppConfig(
+    _cached_config = AppConfig(
         db_path=db_path,
         email=primary_email,  # Primary account for backward compatibility
         email_accounts=email_accounts_list,  # All accounts to monitor
@@ -318,4 +367,4 @@ def load_config() -> AppConfig:
             send_summary_to_email=send_summary_to_email,
         ),
     )
-
+    return _cached_config
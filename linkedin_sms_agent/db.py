@@ -1,7 +1,16 @@
 """SQLite database operations for tracking seen notifications."""
 
 import sqlite3
-from typing import Set, Tuple, Optional
+from datetime import datetime
+from typing import Iterable, Set, Tuple, Optional
+
+# Pairs per IN (VALUES ...) query; keeps parameters under SQLite's 999 limit
+_LOOKUP_CHUNK_SIZE = 400
+
+# mark_seen batches above this size use multi-row INSERTs of _INSERT_CHUNK_SIZE
+# rows (3 parameters each, also under the 999 limit)
+_BULK_INSERT_THRESHOLD = 100
+_INSERT_CHUNK_SIZE = 300
 
 
 def init_db(db_path: str) -> sqlite3.Connection:
@@ -15,6 +24,11 @@ def init_db(db_path: str) -> sqlite3.Connection:
         A connection to the database.
     """
     conn = sqlite3.connect(db_path)
+    # WAL + NORMAL syncs once per checkpoint instead of on every commit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
     conn.execute("""
         CREATE TABLE IF NOT EXISTS seen_items (
             id TEXT NOT NULL,
@@ -23,6 +37,7 @@ def init_db(db_path: str) -> sqlite3.Connection:
             PRIMARY KEY (id, source)
         )
     """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_source ON seen_items(source)")
     conn.execute("""
         CREATE TABLE IF NOT EXISTS meta (
             key TEXT PRIMARY KEY,
@@ -44,7 +59,35 @@ def get_seen_ids(conn: sqlite3.Connection) -> Set[Tuple[str, str]]:
         A set of (id, source) tuples that have been seen.
     """
     cursor = conn.execute("SELECT id, source FROM seen_items")
-    return {(row[0], row[1]) for row in cursor.fetchall()}
+    # Rows are already (id, source) tuples; build the set straight from the cursor
+    return set(cursor)
+
+
+def find_seen(conn: sqlite3.Connection, candidates: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+    """
+    Look up which of the given items have already been seen.
+    
+    Only the candidate keys are queried, so the cost follows the size of the
+    batch rather than the whole seen_items history.
+    
+    Args:
+        conn: Database connection.
+        candidates: (id, source) tuples to check.
+        
+    Returns:
+        The subset of candidates that are already in the database.
+    """
+    pairs = list(dict.fromkeys(candidates))
+    seen = set()
+    for start in range(0, len(pairs), _LOOKUP_CHUNK_SIZE):
+        chunk = pairs[start:start + _LOOKUP_CHUNK_SIZE]
+        placeholders = ",".join(["(?, ?)"] * len(chunk))
+        cursor = conn.execute(
+            f"SELECT id, source FROM seen_items WHERE (id, source) IN (VALUES {placeholders})",
+            [value for pair in chunk for value in pair]
+        )
+        seen.update(cursor)
+    return seen
 
 
 def mark_seen(conn: sqlite3.Connection, items: list[Tuple[str, str]]) -> None:
@@ -55,14 +98,25 @@ def mark_seen(conn: sqlite3.Connection, items: list[Tuple[str, str]]) -> None:
         conn: Database connection.
         items: List of (id, source) tuples to mark as seen.
     """
-    from datetime import datetime
-    
     now = datetime.utcnow().isoformat() + "Z"
-    conn.executemany(
-        "INSERT OR IGNORE INTO seen_items (id, source, first_seen_at) VALUES (?, ?, ?)",
-        [(item_id, source, now) for item_id, source in items]
-    )
-    conn.commit()
+    # One transaction for the whole batch
+    with conn:
+        if len(items) <= _BULK_INSERT_THRESHOLD:
+            conn.executemany(
+                "INSERT INTO seen_items (id, source, first_seen_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (id, source) DO NOTHING",
+                ((item_id, source, now) for item_id, source in items)
+            )
+            return
+        # Large batches: one statement per chunk instead of one execution per row
+        for start in range(0, len(items), _INSERT_CHUNK_SIZE):
+            chunk = items[start:start + _INSERT_CHUNK_SIZE]
+            placeholders = ",".join(["(?, ?, ?)"] * len(chunk))
+            conn.execute(
+                f"INSERT INTO seen_items (id, source, first_seen_at) VALUES {placeholders} "
+                "ON CONFLICT (id, source) DO NOTHING",
+                [value for item_id, source in chunk for value in (item_id, source, now)]
+            )
 
 
 def get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
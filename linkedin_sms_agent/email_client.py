@@ -1,25 +1,103 @@
 """IMAP email client for fetching notifications."""
 
+import asyncio
+import atexit
 import email.message
-import email.utils
+import email.parser
+import email.policy
 import imaplib
 import logging
+import random
 import re
+import socket
+import threading
 import time
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
 from email.header import decode_header
-from typing import List, Optional, Tuple
-from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from html import unescape
 
 from .config import EmailConfig
 from .models import EmailNotification
 
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None  # selectolax is optional; fall back to regex tag stripping
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None  # pyahocorasick is optional; fall back to substring checks
+
 logger = logging.getLogger(__name__)
 
-# Retry configuration
+# Retry configuration: exponential backoff with jitter, for network errors only
 MAX_RETRIES = 3
-RETRY_DELAY = 2  # seconds
+RETRY_DELAY = 2  # seconds, base delay
+RETRY_MAX_DELAY = 30  # seconds, cap before jitter
+
+# One parser for every message (stateless, safe to share between threads)
+_PARSER = email.parser.BytesParser(policy=email.policy.compat32)
+
+# Accounts fetched concurrently by fetch_many (each fetch mostly waits on IMAP I/O)
+MAX_FETCH_WORKERS = 8
+# How long fetch_many waits for the accounts before giving up on the stragglers
+FETCH_TIMEOUT_SECONDS = 60
+
+# Logged-in IMAP connections kept between fetch_notifications calls, keyed by
+# (host, username) with the time they were last returned to the pool
+_POOL: Dict[Tuple[str, str], Tuple[imaplib.IMAP4, float]] = {}
+_POOL_LOCK = threading.Lock()
+IDLE_TTL_SECONDS = 300  # Pooled connections idle longer than this are reopened
+# Notifications already built in this process, keyed by (username, Message-ID),
+# so a message that stays unread across polls skips the body FETCH and parse
+_NOTIFICATION_CACHE: "OrderedDict[Tuple[str, str], EmailNotification]" = OrderedDict()
+_NOTIFICATION_CACHE_LOCK = threading.Lock()
+NOTIFICATION_CACHE_SIZE = 10000
+# Socket timeout, so a hung server fails the fetch instead of blocking it forever
+IMAP_TIMEOUT_SECONDS = 30
+
+MAX_LINKS = 5  # Links kept per email
+
+# Filter lists at least this long are matched with one Aho-Corasick pass
+AHOCORASICK_MIN_TERMS = 8
+
+# Regexes compiled once at import instead of per email/body
+# URL: ASCII-mode classes (no Unicode table lookups); \xa0 is listed explicitly
+# because &nbsp; in HTML text is not ASCII whitespace
+_URL_RE = re.compile(r'https?://[^\s\xa0<>"{}|\\^`\[\]]+[^\s\xa0<>"{}|\\^`\[\].,;:!?]', re.ASCII)
+_TAG_RE = re.compile(r'<[^>]+>')
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_WS_RE = re.compile(r'\s+')
+# Pieces of an IMAP FETCH response: "<seq> (" prefix and the FLAGS list
+_FETCH_SEQ_RE = re.compile(rb'^(\d+) \(')
+_FLAGS_RE = re.compile(rb'FLAGS \(([^)]*)\)')
+_UID_RE = re.compile(rb'UID (\d+)')
+_INTERNALDATE_RE = re.compile(rb'INTERNALDATE "([^"]+)"')
+
+# Only the first part of the body is downloaded; the snippet keeps 600
+# characters and the first 5 links
+BODY_FETCH_BYTES = 16384
+# First pass, for a whole batch: flags, arrival time and just the headers
+# needed to filter a message and later decode its body. PEEK does not set
+# \Seen, so the returned FLAGS still show whether the message was read
+# between SEARCH and FETCH.
+HEADER_FETCH_ITEMS = (
+    "(FLAGS INTERNALDATE BODY.PEEK[HEADER.FIELDS "
+    "(FROM SUBJECT DATE MESSAGE-ID MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING)])"
+)
+# Second pass, only for messages that passed the first: a capped body
+BODY_FETCH_ITEMS = f"(BODY.PEEK[TEXT]<0.{BODY_FETCH_BYTES}>)"
+
+
+class AuthError(imaplib.IMAP4.error):
+    """The IMAP server rejected the login; retrying will not help."""
 
 
 def _decode_header_value(header_value: str) -> str:
@@ -27,6 +105,10 @@ def _decode_header_value(header_value: str) -> str:
     if not header_value:
         return ""
     
+    # Most From/Subject headers have no RFC 2047 encoded-words; skip the decoder
+    if '=?' not in header_value:
+        return header_value.strip()
+    
     decoded_parts = decode_header(header_value)
     decoded_string = ""
     for part, encoding in decoded_parts:
@@ -43,42 +125,57 @@ def _decode_header_value(header_value: str) -> str:
 
 def _extract_links(text: str) -> List[str]:
     """Extract URLs from text."""
-    # Pattern to match URLs
-    url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+[^\s<>"{}|\\^`\[\].,;:!?]'
-    links = re.findall(url_pattern, text)
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_links = []
-    for link in links:
-        if link not in seen:
-            seen.add(link)
-            unique_links.append(link)
-    return unique_links[:5]  # Limit to first 5 links
+    # Every match starts with "http"; skip the regex scan when it can't match
+    if 'http' not in text:
+        return []
+    # Remove duplicates while preserving order, stopping at the first 5 links
+    unique_links = {}
+    for match in _URL_RE.finditer(text):
+        unique_links[match.group()] = None
+        if len(unique_links) == MAX_LINKS:
+            break
+    return list(unique_links)
 
 
 def _extract_plain_text(body: str) -> str:
     """Extract plain text from HTML or return as-is."""
-    # Simple HTML tag removal
-    text = re.sub(r'<[^>]+>', '', body)
+    if HTMLParser is not None:
+        try:
+            # Parsed in C; script/style contents are dropped rather than kept as text
+            tree = HTMLParser(body)
+            for node in tree.css("script, style"):
+                node.decompose()
+            text = tree.text(separator=" ", strip=True)
+            return _WS_RE.sub(' ', text).strip()
+        except Exception as e:
+            logger.debug(f"selectolax failed to parse HTML, using regex fallback: {e}")
+    
+    # Simple HTML tag removal (script/style blocks first, so their contents go too)
+    text = _SCRIPT_STYLE_RE.sub(' ', body)
+    text = _TAG_RE.sub('', text)
     # Decode HTML entities
     text = unescape(text)
     # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     return text.strip()
 
 
-def _get_text_from_message(msg: email.message.Message) -> Tuple[str, str]:
+def _get_text_from_message(msg: email.message.Message) -> Tuple[str, str, bool]:
     """
     Extract plain text and HTML from email message.
     
     Returns:
-        Tuple of (text_content, html_content)
+        Tuple of (text_content, html_content, html_was_stripped), where
+        html_was_stripped is True when text_content was derived from html_content.
     """
     text_content = ""
     html_content = ""
+    html_was_stripped = False
     
     if msg.is_multipart():
         for part in msg.walk():
+            if text_content and html_content:
+                break  # Both bodies found; skip the remaining parts (attachments etc.)
             content_type = part.get_content_type()
             if content_type == "text/plain" and not text_content:
                 payload = part.get_payload(decode=True)
@@ -99,7 +196,9 @@ def _get_text_from_message(msg: email.message.Message) -> Tuple[str, str]:
         # Fallback to HTML if no plain text
         if not text_content and html_content:
             text_content = _extract_plain_text(html_content)
+            html_was_stripped = True
     else:
+        # Single-part message: the payload is the whole body, no walk needed
         payload = msg.get_payload(decode=True)
         if payload:
             content_type = msg.get_content_type()
@@ -109,31 +208,147 @@ def _get_text_from_message(msg: email.message.Message) -> Tuple[str, str]:
                 if content_type == "text/html":
                     html_content = content
                     text_content = _extract_plain_text(content)
+                    html_was_stripped = True
                 else:
                     text_content = content
             except:
                 text_content = payload.decode('utf-8', errors='ignore')
     
-    return text_content, html_content
+    return text_content, html_content, html_was_stripped
+
+
+def _group_fetch_response(fetch_data: list) -> Dict[bytes, Dict[str, bytes]]:
+    """
+    Group a multi-message FETCH response by message.
+    
+    Args:
+        fetch_data: Data list returned by imaplib's fetch() or uid("FETCH", ...).
+        
+    Returns:
+        Dict of UID (sequence number if the response has no UID) ->
+        {"flags": ..., "internaldate": ..., "header": ..., "text": ...}.
+        When the response carries UIDs, untagged FETCH lines without one
+        (unsolicited flag updates) are dropped rather than keyed by their
+        sequence number.
+    """
+    messages: Dict[bytes, Dict[str, bytes]] = {}
+    current = None
+    for part in fetch_data:
+        if isinstance(part, tuple):
+            prefix, literal = part
+        elif isinstance(part, bytes):
+            prefix, literal = part, None
+        else:
+            continue
+        # Every "<seq> (" line starts a message's response, with or without a
+        # literal; anything else continues the previous line's message
+        seq_match = _FETCH_SEQ_RE.match(prefix)
+        if seq_match:
+            current = messages.setdefault(seq_match.group(1), {})
+        if current is None:
+            continue
+        if literal is not None:
+            # BODY[HEADER] or BODY[HEADER.FIELDS (...)], else the BODY[TEXT] slice
+            current["header" if b"BODY[HEADER" in prefix else "text"] = literal
+        # FLAGS, INTERNALDATE and UID can come before the literal (in the prefix) or after it
+        flags_match = _FLAGS_RE.search(prefix)
+        if flags_match:
+            current["flags"] = flags_match.group(1)
+        date_match = _INTERNALDATE_RE.search(prefix)
+        if date_match:
+            current["internaldate"] = date_match.group(1)
+        uid_match = _UID_RE.search(prefix)
+        if uid_match:
+            current["uid"] = uid_match.group(1)
+    if any("uid" in parts for parts in messages.values()):
+        return {parts.pop("uid"): parts for parts in messages.values() if "uid" in parts}
+    return messages
+
+
+def _uid_fetch(mail: imaplib.IMAP4, uids: List[bytes], items: str) -> Dict[bytes, Dict[str, bytes]]:
+    """UID FETCH the given items for all uids in one command, grouped by UID."""
+    status, fetch_data = mail.uid("FETCH", b",".join(uids), items)
+    if status != "OK":
+        logger.warning(f"Failed to fetch messages {uids[0]}..{uids[-1]}")
+        return {}
+    return _group_fetch_response(fetch_data)
 
 
+@lru_cache(maxsize=1024)
 def _parse_date(date_str: str) -> Optional[datetime]:
-    """Parse email date header to UTC datetime."""
+    """Parse email date header to naive UTC datetime."""
     if not date_str:
         return None
     
     try:
         # Parse email date (handles timezone)
-        date_tuple = email.utils.parsedate_tz(date_str)
-        if date_tuple:
-            timestamp = email.utils.mktime_tz(date_tuple)
-            # mktime_tz returns UTC timestamp, so fromtimestamp with UTC
-            dt = datetime.utcfromtimestamp(timestamp)
-            return dt
-    except Exception as e:
+        dt = parsedate_to_datetime(date_str)
+    except (TypeError, ValueError) as e:
         logger.debug(f"Error parsing date '{date_str}': {e}")
+        return None
     
-    return None
+    # A "-0000" zone parses as naive; the value is already UTC
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+@lru_cache(maxsize=64)
+def _term_automaton(terms: Tuple[str, ...]):
+    """Aho-Corasick automaton over lowercased filter terms, built once per term list."""
+    automaton = ahocorasick.Automaton()
+    for term in terms:
+        automaton.add_word(term, term)
+    automaton.make_automaton()
+    return automaton
+
+
+def _contains_any(text: str, terms: Tuple[str, ...]) -> bool:
+    """True if any of the (lowercased) terms occurs in text."""
+    if ahocorasick is not None and len(terms) >= AHOCORASICK_MIN_TERMS:
+        # One scan of text regardless of how many terms there are
+        return next(_term_automaton(terms).iter(text), None) is not None
+    return any(term in text for term in terms)
+
+
+def _parse_internaldate(internaldate: bytes) -> Optional[datetime]:
+    """Parse an IMAP INTERNALDATE value ("17-Jul-1996 02:44:25 -0700") to naive UTC datetime."""
+    try:
+        dt = datetime.strptime(internaldate.decode("ascii").strip(), "%d-%b-%Y %H:%M:%S %z")
+    except (UnicodeDecodeError, ValueError) as e:
+        logger.debug(f"Error parsing INTERNALDATE {internaldate!r}: {e}")
+        return None
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _quote_search_string(value: str) -> str:
+    """Quote a string for an IMAP SEARCH key."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _build_filter_search(config: EmailConfig) -> Optional[str]:
+    """
+    Build an IMAP SEARCH key approximating _matches_filters, so the server
+    only returns candidate messages (used when config.server_side_filters is set).
+    
+    Not equivalent: many servers (Gmail among them) match FROM/SUBJECT by
+    whole word rather than by substring, so the server can leave out
+    messages _matches_filters would accept.
+    
+    Returns:
+        A parenthesized OR expression over FROM/SUBJECT keys, or None if no
+        filters are configured or a term is not ASCII (which would need a
+        CHARSET and is left to the client-side check).
+    """
+    keys = [f"FROM {_quote_search_string(f)}" for f in config.from_filters]
+    keys += [f"SUBJECT {_quote_search_string(k)}" for k in config.subject_keywords]
+    if not keys or not all(key.isascii() for key in keys):
+        return None
+    # IMAP OR takes exactly two keys: OR a OR b c
+    expression = keys[-1]
+    for key in reversed(keys[:-1]):
+        expression = f"OR {key} {expression}"
+    return f"({expression})"
 
 
 def _matches_filters(sender: str, subject: str, config: EmailConfig) -> bool:
@@ -146,77 +361,43 @@ def _matches_filters(sender: str, subject: str, config: EmailConfig) -> bool:
     - If only subject_keywords configured, match emails with those keywords
     - If both configured, match emails that have EITHER from filter OR subject keyword (OR logic)
     """
-    sender_lower = sender.lower()
-    subject_lower = subject.lower()
-    
     # If no filters configured, accept all emails
     if not config.from_filters and not config.subject_keywords:
         return True
     
-    # Check from filters (if configured)
-    from_match = False
-    if config.from_filters:
-        from_match = any(
-            filter_str.lower() in sender_lower
-            for filter_str in config.from_filters
-        )
-    
-    # Check subject keywords (if configured)
-    subject_match = False
-    if config.subject_keywords:
-        subject_match = any(
-            keyword.lower() in subject_lower
-            for keyword in config.subject_keywords
-        )
-    
-    # If both filters are configured, use OR logic (match if either matches)
-    if config.from_filters and config.subject_keywords:
-        return from_match or subject_match
-    
-    # If only one type is configured, use that
-    if config.from_filters:
-        return from_match
-    if config.subject_keywords:
-        return subject_match
-    
-    return True
+    # A matching sender is enough (OR logic), so the subject is only
+    # lowercased and scanned when the sender didn't match
+    if config.from_filters and _contains_any(sender.lower(), config.from_filters_lower):
+        return True
+    return bool(config.subject_keywords) and _contains_any(subject.lower(), config.subject_keywords_lower)
 
 
-def fetch_notifications(
-    config: EmailConfig,
-    skip_filters: bool = False,
-    since_date: Optional[datetime] = None
-) -> List[EmailNotification]:
-    """
-    Fetch the top 10 UNREAD email notifications (newest first) that arrived since a given date.
-    
-    Args:
-        config: Email configuration.
-        skip_filters: If True, skip filter matching and return all unread emails.
-        since_date: Optional datetime. Only fetch emails that arrived after this date.
-        
-    Returns:
-        List of EmailNotification objects (top 10 unread emails, newest first).
-    """
-    notifications = []
+def _connect(config: EmailConfig) -> imaplib.IMAP4:
+    """Open and log in a new IMAP connection, retrying transient network errors."""
     mail = None
+    # Used only for the login-failure hint; computed once rather than per attempt
+    is_yahoo = "yahoo.com" in config.username.lower() or "imap.mail.yahoo.com" in config.host.lower()
     
     # Retry logic for network operations
     for attempt in range(MAX_RETRIES):
         try:
             # Connect to IMAP server
             if config.use_ssl:
-                mail = imaplib.IMAP4_SSL(config.host, config.port)
+                mail = imaplib.IMAP4_SSL(config.host, config.port, timeout=IMAP_TIMEOUT_SECONDS)
             else:
-                mail = imaplib.IMAP4(config.host, config.port)
+                mail = imaplib.IMAP4(config.host, config.port, timeout=IMAP_TIMEOUT_SECONDS)
+            # Send small commands immediately instead of waiting on Nagle's algorithm
+            mail.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
             # Login
             try:
                 mail.login(config.username, config.password)
                 break  # Success, exit retry loop
+            except imaplib.IMAP4.abort:
+                raise  # Connection dropped, not a rejected login; retried below
             except imaplib.IMAP4.error as e:
+                _logout(mail)
                 error_msg = str(e)
-                is_yahoo = "yahoo.com" in config.username.lower() or "imap.mail.yahoo.com" in config.host.lower()
                 
                 if "AUTHENTICATIONFAILED" in error_msg or "Invalid credentials" in error_msg or "Lookup failed" in error_msg:
                     if is_yahoo:
@@ -246,11 +427,16 @@ def fetch_notifications(
                             "3. Verify EMAIL_HOST and EMAIL_PORT are correct\n"
                             "4. For Outlook: May need to enable 'Less secure apps' or use OAuth"
                         )
-                raise  # Don't retry authentication failures
-        except (imaplib.IMAP4.error, OSError, ConnectionError) as e:
+                raise AuthError(error_msg) from e  # Don't retry authentication failures
+        except (imaplib.IMAP4.abort, OSError) as e:
+            # OSError covers socket timeouts and refused/reset connections
+            if mail is not None:
+                _logout(mail)
+                mail = None
             if attempt < MAX_RETRIES - 1:
-                logger.warning(f"Connection attempt {attempt + 1} failed: {e}. Retrying in {RETRY_DELAY}s...")
-                time.sleep(RETRY_DELAY)
+                delay = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** attempt) + random.uniform(0, RETRY_DELAY)
+                logger.warning(f"Connection attempt {attempt + 1} failed: {e}. Retrying in {delay:.1f}s...")
+                time.sleep(delay)
                 continue
             else:
                 logger.error(f"Failed to connect after {MAX_RETRIES} attempts: {e}")
@@ -259,16 +445,137 @@ def fetch_notifications(
     if mail is None:
         raise ConnectionError("Failed to establish IMAP connection")
     
+    return mail
+
+
+def _logout(mail: imaplib.IMAP4) -> None:
+    """Log out of an IMAP connection, ignoring errors from a dead socket."""
+    try:
+        mail.logout()
+    except Exception:
+        pass
+
+
+def _get_connection(config: EmailConfig) -> imaplib.IMAP4:
+    """
+    Take a logged-in connection for (host, username) from the pool, or open a
+    new one if there is none, it has been idle too long, or it fails NOOP.
+    """
+    key = (config.host, config.username)
+    with _POOL_LOCK:
+        entry = _POOL.pop(key, None)
+    if entry is not None:
+        mail, released_at = entry
+        if time.monotonic() - released_at < IDLE_TTL_SECONDS:
+            try:
+                mail.noop()
+                return mail
+            except (imaplib.IMAP4.error, OSError):
+                pass  # Server dropped it (IMAP4.abort is an IMAP4.error); reconnect
+        _logout(mail)
+    return _connect(config)
+
+
+def _release_connection(config: EmailConfig, mail: imaplib.IMAP4, reusable: bool) -> None:
+    """Close the selected mailbox and return the connection to the pool, or log out."""
+    if reusable:
+        try:
+            if mail.state == "SELECTED":
+                mail.close()
+        except (imaplib.IMAP4.error, OSError) as e:
+            logger.debug(f"Error closing mailbox (may be disconnected): {e}")
+            reusable = False
+    if reusable:
+        key = (config.host, config.username)
+        with _POOL_LOCK:
+            if key not in _POOL:
+                _POOL[key] = (mail, time.monotonic())
+                return
+    _logout(mail)
+
+
+def _close_pool() -> None:
+    """Log out of every pooled connection (registered to run at interpreter exit)."""
+    with _POOL_LOCK:
+        entries = list(_POOL.values())
+        _POOL.clear()
+    for mail, _ in entries:
+        _logout(mail)
+
+
+atexit.register(_close_pool)
+
+
+def _get_cached_notification(key: Tuple[str, str]) -> Optional[EmailNotification]:
+    """Return the cached notification for (username, Message-ID), if any."""
+    with _NOTIFICATION_CACHE_LOCK:
+        notification = _NOTIFICATION_CACHE.get(key)
+        if notification is not None:
+            _NOTIFICATION_CACHE.move_to_end(key)
+        return notification
+
+
+def _cache_notification(key: Tuple[str, str], notification: EmailNotification) -> None:
+    """Cache a notification, evicting the least recently used past NOTIFICATION_CACHE_SIZE."""
+    with _NOTIFICATION_CACHE_LOCK:
+        _NOTIFICATION_CACHE[key] = notification
+        _NOTIFICATION_CACHE.move_to_end(key)
+        if len(_NOTIFICATION_CACHE) > NOTIFICATION_CACHE_SIZE:
+            _NOTIFICATION_CACHE.popitem(last=False)
+
+
+def uid_mark_key(config: EmailConfig) -> str:
+    """Key of an account's entry in the uid_marks dict passed to fetch_notifications."""
+    return f"{config.username}@{config.host}/{config.folder}"
+
+
+def fetch_notifications(
+    config: EmailConfig,
+    skip_filters: bool = False,
+    since_date: Optional[datetime] = None,
+    uid_marks: Optional[Dict[str, List[int]]] = None
+) -> List[EmailNotification]:
+    """
+    Fetch the top 10 UNREAD email notifications (newest first) that arrived since a given date.
+    
+    Args:
+        config: Email configuration.
+        skip_filters: If True, skip filter matching and return all unread emails.
+        since_date: Optional datetime. Only fetch emails that arrived after this date.
+        uid_marks: Optional dict of [UIDVALIDITY, highest UID found] per account
+            (see uid_mark_key). Only UIDs above the account's mark are searched.
+            After a successful fetch the mark is updated in place to the highest
+            UID that was returned or deliberately skipped.
+        
+    Returns:
+        List of EmailNotification objects (top 10 unread emails, newest first).
+    """
+    notifications = []
+    mail = _get_connection(config)
+    # Only a connection that finished without errors goes back to the pool
+    reusable = False
+    
     try:
         
         # Select folder
         status, _ = mail.select(config.folder)
         if status != "OK":
             logger.error(f"Failed to select folder: {config.folder}")
-            mail.close()
-            mail.logout()
+            reusable = True
             return []
         
+        # UIDs only increase within one UIDVALIDITY, so everything at or below
+        # the last mark has already been looked at by an earlier run
+        last_uid = 0
+        uidvalidity = None
+        if uid_marks is not None:
+            _, validity_data = mail.response("UIDVALIDITY")
+            if validity_data and validity_data[-1]:
+                uidvalidity = int(validity_data[-1])
+                mark = uid_marks.get(uid_mark_key(config))
+                if mark and mark[0] == uidvalidity:
+                    last_uid = mark[1]
+        
         # Build IMAP search criteria for UNREAD emails
         # CRITICAL: UNSEEN flag ensures we ONLY get unread emails
         search_criteria = ["UNSEEN"]  # Only unread emails
@@ -278,7 +585,7 @@ def fetch_notifications(
         if since_date:
             # IMAP SINCE uses date format, but we need to be precise
             # Use the date from since_date, but IMAP will include all emails on that date
-            # To be more precise, we'll filter by date and then check timestamps in Python
+            # To be more precise, we'll filter on each message's INTERNALDATE in Python
             date_str = since_date.strftime("%d-%b-%Y")
             search_criteria.append(f"SINCE {date_str}")
             logger.info(
@@ -287,190 +594,274 @@ def fetch_notifications(
             )
         else:
             logger.info(f"Searching for top 10 UNREAD (UNSEEN) emails from {config.username} (no time filter)")
+        if last_uid:
+            search_criteria.append(f"UID {last_uid + 1}:*")
 
-        # Search for unread messages only (no time filter)
+        # Opt-in: let the server pre-filter on from/subject. Its matching is
+        # looser or stricter depending on the server, so this can drop
+        # messages; _matches_filters still rejects the extra ones it returns
+        if not skip_filters and config.server_side_filters:
+            filter_search = _build_filter_search(config)
+            if filter_search:
+                search_criteria.append(filter_search)
+        
+        # Search for unread messages; UIDs stay valid across the later FETCHes
         search_query = " ".join(search_criteria)
-        status, message_numbers = mail.search(None, search_query)
+        status, message_numbers = mail.uid("SEARCH", None, search_query)
 
         if status != "OK" or not message_numbers[0]:
             logger.info(f"No UNREAD emails found from {config.username}")
-            mail.close()
-            mail.logout()
+            reusable = True
             return []
         
         message_ids = message_numbers[0].split()
+        if last_uid:
+            # "n:*" always matches the highest UID, even when it is below n
+            message_ids = [uid for uid in message_ids if int(uid) > last_uid]
+            if not message_ids:
+                logger.info(f"No new UNREAD emails found from {config.username}")
+                reusable = True
+                return []
         total_unread_found = len(message_ids)
         
         # IMAP returns UIDs in ascending order (oldest first)
-        # Reverse to get newest first, then take top 10
+        # Reverse to get newest first; messages are fetched in batches of
+        # max_emails until that many have been collected
         message_ids.reverse()  # Now newest first
         max_emails = getattr(config, 'max_emails_per_fetch', 10)
         
-        # Limit to top 10 unread emails (newest first)
-        if total_unread_found > max_emails:
-            message_ids = message_ids[:max_emails]
-            logger.info(
-                f"Found {total_unread_found} UNREAD emails from {config.username}, "
-                f"limiting to top {max_emails} most recent (newest first)"
-            )
-        else:
-            logger.info(
-                f"Found {total_unread_found} UNREAD emails from {config.username} "
-                f"(all will be processed, within limit of {max_emails})"
-            )
-        
-        if not message_ids:
-            logger.debug(f"No UNREAD emails to process for {config.username}")
-            mail.close()
-            mail.logout()
-            return []
-        
-        logger.info(f"Processing top {len(message_ids)} UNREAD emails (newest first) from {config.username}")
+        logger.info(
+            f"Found {total_unread_found} UNREAD emails from {config.username}, "
+            f"collecting up to {max_emails} most recent (newest first)"
+        )
         
         # Process each message - verify it's still unread before processing
         # This prevents processing emails that were read between search and fetch
         processed = 0
         skipped_read = 0
-        for msg_id in message_ids:
-            try:
-                # Double-check that email is still unread before processing
-                status, msg_data_flags = mail.fetch(msg_id, "(FLAGS)")
-                if status != "OK":
-                    logger.debug(f"Failed to fetch flags for message {msg_id}")
-                    continue
-                
-                flags_str = msg_data_flags[0][0].decode() if isinstance(msg_data_flags[0][0], bytes) else str(msg_data_flags[0][0])
-                is_unread = "\\Seen" not in flags_str
-                
-                if not is_unread:
-                    logger.debug(f"Email {msg_id} was marked as read between search and fetch, skipping.")
-                    skipped_read += 1
-                    processed += 1
-                    continue
-                
-                # Fetch full message content
-                status, msg_data = mail.fetch(msg_id, "(RFC822)")
-                
-                if status != "OK":
-                    logger.warning(f"Failed to fetch message {msg_id}")
-                    continue
-                
-                # Parse message
-                msg = email.message_from_bytes(msg_data[0][1])
-                
-                # Extract headers
-                from_header = _decode_header_value(msg.get("From", ""))
-                subject = _decode_header_value(msg.get("Subject", ""))
-                message_id_header = msg.get("Message-ID", "")
-                date_header = msg.get("Date", "")
-                
-                # Apply filters only if not skipping
-                if not skip_filters and not _matches_filters(from_header, subject, config):
-                    logger.debug(f"Skipping email: From={from_header[:40]}, Subject={subject[:40]} (doesn't match filters)")
-                    processed += 1
-                    continue
-                
-                # Get unique ID
-                unique_id = message_id_header.strip("<>") if message_id_header else str(msg_id.decode())
-                
-                # Extract text snippet and HTML
-                text_content, html_content = _get_text_from_message(msg)
-                snippet = text_content[:600].strip()
-                if len(text_content) > 600:
-                    snippet += "..."
-                
-                # Extract links from both HTML and plain text (HTML has more reliable links)
-                links = []
-                if html_content:
-                    # Extract from HTML (more reliable)
-                    links = _extract_links(html_content)
-                if not links and text_content:
-                    # Fallback to plain text
-                    links = _extract_links(text_content)
-                
-                # Parse date
-                received_dt = _parse_date(date_header)
-                if not received_dt:
-                    received_dt = datetime.utcnow()
-
-                # CRITICAL: Filter out emails that arrived before since_date
-                # IMAP SINCE includes the entire day, so we need to filter by exact time
-                if since_date:
-                    # Convert received_dt to naive UTC for comparison
-                    received_naive = received_dt.replace(tzinfo=None) if received_dt.tzinfo else received_dt
-                    if received_naive <= since_date:
+        # Highest UID that was skipped on purpose or returned; the UID mark only moves this far
+        highest_examined = 0
+        for start in range(0, len(message_ids), max_emails):
+            batch = message_ids[start:start + max_emails]
+            
+            # Pass 1: decide from flags and headers which messages are wanted
+            headers = _uid_fetch(mail, batch, HEADER_FETCH_ITEMS)
+            candidates = []
+            for msg_id in batch:
+                try:
+                    fetched_msg = headers.get(msg_id)
+                    if not fetched_msg or "header" not in fetched_msg:
+                        logger.warning(f"Failed to fetch message {msg_id}")
+                        continue
+                    
+                    # Double-check that email is still unread before processing
+                    is_unread = b"\\Seen" not in fetched_msg.get("flags", b"")
+                    
+                    if not is_unread:
+                        logger.debug(f"Email {msg_id} was marked as read between search and fetch, skipping.")
+                        skipped_read += 1
+                        processed += 1
+                        highest_examined = max(highest_examined, int(msg_id))
+                        continue
+                    
+                    # Extract headers
+                    header_msg = _PARSER.parsebytes(fetched_msg["header"], headersonly=True)
+                    from_header = _decode_header_value(header_msg.get("From", ""))
+                    subject = _decode_header_value(header_msg.get("Subject", ""))
+                    message_id_header = header_msg.get("Message-ID", "")
+                    date_header = header_msg.get("Date", "")
+                    
+                    # Arrival time from the server (INTERNALDATE), falling back to the Date header
+                    received_dt = None
+                    if "internaldate" in fetched_msg:
+                        received_dt = _parse_internaldate(fetched_msg["internaldate"])
+                    if not received_dt:
+                        received_dt = _parse_date(date_header)
+                    if not received_dt:
+                        received_dt = datetime.utcnow()
+                    
+                    # CRITICAL: Filter out emails that arrived before since_date
+                    # IMAP SINCE includes the entire day, so we need to filter by exact time
+                    if since_date and received_dt <= since_date:
                         logger.debug(
-                            f"Skipping email {unique_id[:40]}... - received {received_naive.isoformat()} "
+                            f"Skipping email {msg_id} - received {received_dt.isoformat()} "
                             f"is before cutoff {since_date.isoformat()}"
                         )
                         processed += 1
+                        highest_examined = max(highest_examined, int(msg_id))
                         continue
-
-                received_at = received_dt.isoformat() + "Z"
-                
-                notifications.append(EmailNotification(
-                    id=unique_id,
-                    sender=from_header,
-                    subject=subject,
-                    snippet=snippet,
-                    received_at=received_at,
-                    email_account=config.username,
-                    links=links,
-                ))
-                processed += 1
-                logger.debug(f"Added email: From={from_header[:40]}, Subject={subject[:40]}")
-                
-            except Exception as e:
-                logger.debug(f"Error processing message {msg_id}: {e}")
-                processed += 1
-                continue
-        
-        # Close connection gracefully, handling server disconnects
-        try:
-            mail.close()
-        except Exception as e:
-            logger.debug(f"Error closing mailbox (may be disconnected): {e}")
+                    
+                    # Apply filters only if not skipping
+                    if not skip_filters and not _matches_filters(from_header, subject, config):
+                        logger.debug(f"Skipping email: From={from_header[:40]}, Subject={subject[:40]} (doesn't match filters)")
+                        processed += 1
+                        highest_examined = max(highest_examined, int(msg_id))
+                        continue
+                    
+                    candidates.append((msg_id, fetched_msg["header"], from_header, subject, message_id_header, received_dt))
+                except Exception as e:
+                    logger.debug(f"Error processing message {msg_id}: {e}")
+                    processed += 1
+            
+            # Pass 2: bodies, only for as many wanted messages as are still needed
+            candidates = candidates[:max_emails - len(notifications)]
+            cached = {}
+            for msg_id, _, _, _, message_id_header, _ in candidates:
+                if message_id_header:
+                    notification = _get_cached_notification((config.username, message_id_header))
+                    if notification is not None:
+                        cached[msg_id] = notification
+            to_fetch = [c[0] for c in candidates if c[0] not in cached]
+            bodies = _uid_fetch(mail, to_fetch, BODY_FETCH_ITEMS) if to_fetch else {}
+            for msg_id, header_bytes, from_header, subject, message_id_header, received_dt in candidates:
+                if msg_id in cached:
+                    notifications.append(cached[msg_id])
+                    processed += 1
+                    highest_examined = max(highest_examined, int(msg_id))
+                    continue
+                try:
+                    # Parse headers plus the capped body as one message; a multipart
+                    # body cut at the cap still yields its leading text parts
+                    msg = _PARSER.parsebytes(header_bytes + bodies.get(msg_id, {}).get("text", b""))
+                    
+                    # Get unique ID
+                    unique_id = message_id_header.strip("<>") if message_id_header else str(msg_id.decode())
+                    
+                    # Extract text snippet and HTML
+                    text_content, html_content, html_was_stripped = _get_text_from_message(msg)
+                    snippet = text_content[:600].strip()
+                    if len(text_content) > 600:
+                        snippet += "..."
+                    
+                    # Extract links from both HTML and plain text (HTML has more reliable links)
+                    links = []
+                    if html_content:
+                        # Extract from HTML (more reliable)
+                        links = _extract_links(html_content)
+                    if not links and text_content and not html_was_stripped:
+                        # Fallback to plain text (text stripped from the HTML has no
+                        # URLs the HTML scan didn't already see)
+                        links = _extract_links(text_content)
+                    
+                    # Fixed-width, second precision, so received_at strings also sort chronologically
+                    received_at = f"{received_dt:%Y-%m-%dT%H:%M:%S}Z"
+                    
+                    notification = EmailNotification(
+                        id=unique_id,
+                        sender=from_header,
+                        subject=subject,
+                        snippet=snippet,
+                        received_at=received_at,
+                        email_account=config.username,
+                        links=links,
+                    )
+                    notifications.append(notification)
+                    if message_id_header:
+                        _cache_notification((config.username, message_id_header), notification)
+                    processed += 1
+                    highest_examined = max(highest_examined, int(msg_id))
+                    logger.debug(f"Added email: From={from_header[:40]}, Subject={subject[:40]}")
+                    
+                except Exception as e:
+                    logger.debug(f"Error processing message {msg_id}: {e}")
+                    processed += 1
+                    continue
+            
+            if len(notifications) >= max_emails:
+                break  # Enough; later batches are never fetched
         
-        try:
-            mail.logout()
-        except Exception as e:
-            logger.debug(f"Error logging out (connection may be closed): {e}")
+        # Only now that every FETCH succeeded, move the mark past what was examined
+        if uidvalidity is not None and highest_examined > last_uid:
+            uid_marks[uid_mark_key(config)] = [uidvalidity, highest_examined]
+        reusable = True
         
         if skipped_read > 0:
             logger.info(
                 f"Extracted {len(notifications)} emails from {config.username} "
-                f"(processed {len(message_ids)} emails, {skipped_read} were read between search/fetch, top {max_emails} limit applied)"
+                f"(processed {processed} emails, {skipped_read} were read between search/fetch, top {max_emails} limit applied)"
             )
         else:
             logger.info(
                 f"Extracted {len(notifications)} emails from {config.username} "
-                f"(processed {len(message_ids)} UNREAD emails, top {max_emails} limit applied)"
+                f"(processed {processed} UNREAD emails, top {max_emails} limit applied)"
             )
         
     except Exception as e:
         logger.error(f"Error fetching email notifications from {config.username}: {e}", exc_info=True)
-        # Ensure connection is closed on error
-        if mail:
-            try:
-                mail.close()
-            except:
-                pass
-            try:
-                mail.logout()
-            except:
-                pass
         raise
     finally:
-        # Ensure connection is always closed
-        if mail:
-            try:
-                mail.close()
-            except:
-                pass
-            try:
-                mail.logout()
-            except:
-                pass
+        # Keep the logged-in connection for the next call unless something failed
+        _release_connection(config, mail, reusable)
+    
+    return notifications
+
+
+def fetch_many(configs: List[EmailConfig], **kwargs) -> List[EmailNotification]:
+    """
+    Fetch notifications from several accounts concurrently.
     
+    Each account is fetched with fetch_notifications on a worker thread; a
+    failing account, or one still running after FETCH_TIMEOUT_SECONDS, is
+    logged and skipped so the others still return. Pooled connections are
+    checked out exclusively, so two threads never share one.
+    
+    Args:
+        configs: Email configurations, one per account.
+        **kwargs: Passed to fetch_notifications (skip_filters, since_date,
+            uid_marks). uid_marks only takes the marks of accounts that
+            finished, so a skipped account's messages are searched again.
+        
+    Returns:
+        Notifications from all accounts, in the order of configs.
+    """
+    if not configs:
+        return []
+    
+    uid_marks = kwargs.pop("uid_marks", None)
+    notifications = []
+    executor = ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(configs)))
+    try:
+        futures = []
+        for config in configs:
+            account_marks = dict(uid_marks) if uid_marks is not None else None
+            futures.append((account_marks, executor.submit(
+                fetch_notifications, config, uid_marks=account_marks, **kwargs
+            )))
+        # The accounts run at the same time, so they share one deadline
+        deadline = time.monotonic() + FETCH_TIMEOUT_SECONDS
+        for config, (account_marks, future) in zip(configs, futures):
+            try:
+                account_emails = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                logger.error(f"Timed out fetching emails from {config.username}, skipping")
+                continue
+            except Exception as e:
+                logger.error(f"Error fetching emails from {config.username}: {e}", exc_info=True)
+                continue  # Continue with other accounts even if one fails
+            logger.info(f"Found {len(account_emails)} unread emails from {config.username}")
+            notifications.extend(account_emails)
+            key = uid_mark_key(config)
+            if account_marks and key in account_marks:
+                uid_marks[key] = account_marks[key]
+    finally:
+        # Don't wait for a hung account; its thread ends at the socket timeout
+        executor.shutdown(wait=False, cancel_futures=True)
     return notifications
 
+
+async def fetch_notifications_async(config: EmailConfig, **kwargs) -> List[EmailNotification]:
+    """
+    Awaitable fetch_notifications for callers running an event loop.
+    
+    The blocking IMAP work (including retry sleeps) runs on a worker thread,
+    so the event loop keeps serving other tasks; several accounts can be
+    awaited together with asyncio.gather.
+    
+    Args:
+        config: Email configuration.
+        **kwargs: Passed to fetch_notifications (skip_filters, since_date).
+        
+    Returns:
+        List of EmailNotification objects, as from fetch_notifications.
+    """
+    return await asyncio.to_thread(fetch_notifications, config, **kwargs)
@@ -1,14 +1,15 @@
 """Main entry point for the notification agent."""
 
 import argparse
+import json
 import logging
 import os
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from .config import AppConfig, load_config
-from .db import clear_seen_items, get_meta, get_seen_ids, init_db, mark_seen, set_meta
-from .email_client import fetch_notifications
+from .db import clear_seen_items, find_seen, get_meta, init_db, mark_seen, set_meta
+from .email_client import fetch_many
 from .email_notifier import send_email
 from .rss_client import fetch_items
 # Scheduler removed - using cron for 15-minute intervals
@@ -75,26 +76,24 @@ def run_once(args=None) -> None:
             last_run = datetime.utcnow() - timedelta(minutes=15)
             logger.info(f"No previous run found, only fetching UNREAD emails from last 15 minutes (ignoring older unread emails)")
 
+        # Highest IMAP UID looked at per account, so the search skips older messages
+        try:
+            uid_marks = json.loads(get_meta(conn, "imap_uid_marks") or "{}")
+        except ValueError:
+            logger.warning("Could not parse stored IMAP UID marks, searching by date only")
+            uid_marks = {}
+
         logger.info("Starting notification fetch (fetching top 10 UNREAD emails per account since last run)...")
 
-        # Fetch email notifications from all configured accounts
+        # Fetch email notifications from all configured accounts (in parallel)
         # Get top 10 UNREAD emails (newest first) that arrived since last run
-        all_email_notifications = []
         logger.info(f"Monitoring {len(config.email_accounts)} email account(s)...")
-
-        for email_config in config.email_accounts:
-            logger.info(f"Fetching top 10 UNREAD emails from {email_config.username} (since last run)...")
-            try:
-                account_emails = fetch_notifications(
-                    email_config, 
-                    skip_filters=True,  # Get all unread emails, no filtering
-                    since_date=last_run  # Only emails since last run
-                )
-                logger.info(f"Found {len(account_emails)} unread emails from {email_config.username}")
-                all_email_notifications.extend(account_emails)
-            except Exception as e:
-                logger.error(f"Error fetching emails from {email_config.username}: {e}", exc_info=True)
-                continue  # Continue with other accounts even if one fails
+        all_email_notifications = fetch_many(
+            config.email_accounts,
+            skip_filters=True,  # Get all unread emails, no filtering
+            since_date=last_run,  # Only emails since last run
+            uid_marks=uid_marks  # Updated in place, saved below with last_run
+        )
         
         logger.info(f"Total emails found across all accounts: {len(all_email_notifications)}")
         email_notifications = all_email_notifications
@@ -107,7 +106,12 @@ def run_once(args=None) -> None:
             logger.info(f"Found {len(rss_items)} RSS items")
         
         # Check database to filter out emails we've already processed
-        seen_ids = get_seen_ids(conn)
+        # (only this run's candidates are looked up, not the whole history)
+        seen_ids = find_seen(
+            conn,
+            [(email.id, "email") for email in email_notifications] +
+            [(item.id, "rss") for item in rss_items]
+        )
         
         # Filter to new items (not seen before)
         new_emails = [
@@ -355,6 +359,7 @@ def run_once(args=None) -> None:
         mark_seen(conn, items_to_mark)
         # Update last_run timestamp so next run only processes emails since now
         set_meta(conn, "last_run", datetime.utcnow().isoformat() + "Z")
+        set_meta(conn, "imap_uid_marks", json.dumps(uid_marks))
         conn.close()
         
         logger.info("Run completed successfully.")
@@ -0,0 +1,81 @@
+"""Tests for the seen-items lookups and inserts in linkedin_sms_agent.db."""
+
+from datetime import datetime
+
+import pytest
+
+from linkedin_sms_agent import db
+
+
+@pytest.fixture
+def conn(tmp_path):
+    connection = db.init_db(str(tmp_path / "seen.db"))
+    yield connection
+    connection.close()
+
+
+def test_find_seen_returns_only_seen_candidates(conn):
+    db.mark_seen(conn, [("a", "email"), ("b", "rss")])
+
+    seen = db.find_seen(conn, [("a", "email"), ("b", "email"), ("c", "rss")])
+
+    assert seen == {("a", "email")}
+
+
+def test_find_seen_with_no_candidates(conn):
+    db.mark_seen(conn, [("a", "email")])
+
+    assert db.find_seen(conn, []) == set()
+
+
+def test_find_seen_ignores_duplicate_candidates(conn):
+    db.mark_seen(conn, [("a", "email")])
+
+    assert db.find_seen(conn, [("a", "email"), ("a", "email"), ("b", "email")]) == {("a", "email")}
+
+
+def test_find_seen_across_chunks(conn, monkeypatch):
+    monkeypatch.setattr(db, "_LOOKUP_CHUNK_SIZE", 2)
+    db.mark_seen(conn, [("1", "email"), ("3", "email"), ("5", "email")])
+
+    candidates = [(str(i), "email") for i in range(1, 7)]
+
+    assert db.find_seen(conn, candidates) == {("1", "email"), ("3", "email"), ("5", "email")}
+
+
+def test_find_seen_above_sqlite_parameter_limit(conn):
+    # 1500 pairs is 3000 parameters; only chunking keeps each query under 999
+    items = [(f"id-{i}", "email") for i in range(1500)]
+    db.mark_seen(conn, items[::2])
+
+    assert db.find_seen(conn, items) == set(items[::2])
+
+
+def test_mark_seen_small_batch_ignores_existing_items(conn):
+    db.mark_seen(conn, [("a", "email")])
+    db.mark_seen(conn, [("a", "email"), ("b", "email")])
+
+    assert db.get_seen_ids(conn) == {("a", "email"), ("b", "email")}
+
+
+def test_mark_seen_bulk_batch_across_chunks(conn, monkeypatch):
+    monkeypatch.setattr(db, "_BULK_INSERT_THRESHOLD", 2)
+    monkeypatch.setattr(db, "_INSERT_CHUNK_SIZE", 3)
+    db.mark_seen(conn, [("0", "email")])
+
+    items = [(str(i), "email") for i in range(8)]
+    db.mark_seen(conn, items)
+
+    assert db.get_seen_ids(conn) == set(items)
+
+
+def test_mark_seen_keeps_first_seen_at(conn):
+    db.mark_seen(conn, [("a", "email")])
+    (first,) = conn.execute("SELECT first_seen_at FROM seen_items").fetchone()
+
+    db.mark_seen(conn, [("a", "email")])
+    (again,) = conn.execute("SELECT first_seen_at FROM seen_items").fetchone()
+
+    assert again == first
+    assert first.endswith("Z")
+    datetime.fromisoformat(first[:-1])
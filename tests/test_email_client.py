@@ -0,0 +1,253 @@
+"""Tests for FETCH response grouping, the server-side filter search and UID marks."""
+
+import imaplib
+import re
+from collections import OrderedDict
+
+import pytest
+
+from linkedin_sms_agent import email_client
+from linkedin_sms_agent.config import EmailConfig
+
+
+def make_config(**overrides) -> EmailConfig:
+    values = dict(
+        host="imap.example.com",
+        port=993,
+        username="me@example.com",
+        password="secret",
+        use_ssl=True,
+        folder="INBOX",
+        from_filters=[],
+        subject_keywords=[],
+    )
+    values.update(overrides)
+    return EmailConfig(**values)
+
+
+# _group_fetch_response
+
+def test_group_fetch_response_keys_by_uid():
+    fetch_data = [
+        (b'1 (UID 7 FLAGS (\\Seen) INTERNALDATE "01-Jan-2026 10:00:00 +0000" '
+         b'BODY[HEADER.FIELDS (FROM SUBJECT)] {6}', b"hdr-7\n"),
+        b")",
+        (b"2 (UID 9 BODY[HEADER.FIELDS (FROM SUBJECT)] {6}", b"hdr-9\n"),
+        b" FLAGS ())",
+    ]
+
+    assert email_client._group_fetch_response(fetch_data) == {
+        b"7": {"flags": b"\\Seen", "internaldate": b"01-Jan-2026 10:00:00 +0000", "header": b"hdr-7\n"},
+        b"9": {"header": b"hdr-9\n", "flags": b""},
+    }
+
+
+def test_group_fetch_response_text_literal():
+    fetch_data = [(b"3 (UID 12 BODY[TEXT]<0> {4}", b"body"), b")"]
+
+    assert email_client._group_fetch_response(fetch_data) == {b"12": {"text": b"body"}}
+
+
+def test_group_fetch_response_drops_unsolicited_lines_without_uid():
+    fetch_data = [
+        (b"1 (UID 7 BODY[TEXT]<0> {4}", b"body"),
+        b")",
+        b"4 (FLAGS (\\Seen))",
+    ]
+
+    assert email_client._group_fetch_response(fetch_data) == {b"7": {"text": b"body"}}
+
+
+def test_group_fetch_response_without_uids_keys_by_sequence():
+    fetch_data = [
+        (b"1 (FLAGS () BODY[HEADER] {3}", b"h-1"),
+        b")",
+        b"2 (FLAGS (\\Seen))",
+    ]
+
+    assert email_client._group_fetch_response(fetch_data) == {
+        b"1": {"header": b"h-1", "flags": b""},
+        b"2": {"flags": b"\\Seen"},
+    }
+
+
+def test_group_fetch_response_ignores_data_before_first_message():
+    assert email_client._group_fetch_response([b")", None, (b" BODY[TEXT] {1}", b"x")]) == {}
+
+
+# _build_filter_search
+
+def test_build_filter_search_without_filters():
+    assert email_client._build_filter_search(make_config()) is None
+
+
+def test_build_filter_search_single_key():
+    config = make_config(from_filters=["@linkedin.com"])
+
+    assert email_client._build_filter_search(config) == '(FROM "@linkedin.com")'
+
+
+def test_build_filter_search_nests_or_pairs():
+    config = make_config(from_filters=["@linkedin.com"], subject_keywords=["commented", "shared"])
+
+    assert email_client._build_filter_search(config) == (
+        '(OR FROM "@linkedin.com" OR SUBJECT "commented" SUBJECT "shared")'
+    )
+
+
+def test_build_filter_search_quotes_terms():
+    config = make_config(subject_keywords=['say "hi"', "back\\slash"])
+
+    assert email_client._build_filter_search(config) == (
+        '(OR SUBJECT "say \\"hi\\"" SUBJECT "back\\\\slash")'
+    )
+
+
+def test_build_filter_search_leaves_non_ascii_to_the_client():
+    config = make_config(from_filters=["@linkedin.com"], subject_keywords=["café"])
+
+    assert email_client._build_filter_search(config) is None
+
+
+# UID marks in fetch_notifications
+
+class FakeIMAP:
+    """In-memory stand-in for a selected IMAP mailbox."""
+
+    def __init__(self, uids, uidvalidity=42, fail_fetch=False):
+        self.uids = sorted(uids)
+        self.uidvalidity = uidvalidity
+        self.fail_fetch = fail_fetch
+        self.searches = []
+        self.fetched = []
+        self.state = "SELECTED"
+
+    def select(self, folder):
+        return "OK", [str(len(self.uids)).encode()]
+
+    def response(self, code):
+        return code, [str(self.uidvalidity).encode()]
+
+    def uid(self, command, *args):
+        if command == "SEARCH":
+            return self._search(args[1])
+        return self._fetch(args[0], args[1])
+
+    def _search(self, query):
+        self.searches.append(query)
+        found = self.uids
+        match = re.search(r"UID (\d+):\*", query)
+        if match:
+            # Like a real server, "n:*" matches the highest UID even when it is below n
+            found = [uid for uid in self.uids if uid >= int(match.group(1))] or self.uids[-1:]
+        return "OK", [b" ".join(str(uid).encode() for uid in found)]
+
+    def _fetch(self, uid_set, items):
+        if self.fail_fetch:
+            raise imaplib.IMAP4.abort("connection lost")
+        data = []
+        for seq, uid in enumerate(uid_set.split(b","), start=1):
+            if "HEADER" in items:
+                header = (
+                    f"From: jobs@linkedin.com\r\nSubject: Update {uid.decode()}\r\n"
+                    f"Message-ID: <msg-{uid.decode()}@example.com>\r\n\r\n"
+                ).encode()
+                prefix = (
+                    f'{seq} (UID {uid.decode()} FLAGS () INTERNALDATE "01-Jan-2026 10:00:00 +0000" '
+                    f"BODY[HEADER.FIELDS (FROM SUBJECT)] {{{len(header)}}}"
+                ).encode()
+                data += [(prefix, header), b")"]
+            else:
+                body = b"Hello"
+                data += [(f"{seq} (UID {uid.decode()} BODY[TEXT]<0> {{{len(body)}}}".encode(), body), b")"]
+            self.fetched.append(uid)
+        return "OK", data
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Route fetch_notifications to a FakeIMAP and isolate the notification cache."""
+    monkeypatch.setattr(email_client, "_NOTIFICATION_CACHE", OrderedDict())
+    monkeypatch.setattr(email_client, "_release_connection", lambda config, mail, reusable: None)
+
+    def serve(mail):
+        monkeypatch.setattr(email_client, "_get_connection", lambda config: mail)
+        return mail
+
+    return serve
+
+
+def test_first_fetch_sets_mark_to_highest_uid(serve):
+    config = make_config()
+    mail = serve(FakeIMAP([5, 6, 7]))
+    uid_marks = {}
+
+    notifications = email_client.fetch_notifications(config, uid_marks=uid_marks)
+
+    assert [n.subject for n in notifications] == ["Update 7", "Update 6", "Update 5"]
+    assert "UID" not in mail.searches[0]
+    assert uid_marks == {email_client.uid_mark_key(config): [42, 7]}
+
+
+def test_mark_limits_search_to_newer_uids(serve):
+    config = make_config()
+    mail = serve(FakeIMAP([5, 6, 7, 8]))
+    uid_marks = {email_client.uid_mark_key(config): [42, 6]}
+
+    notifications = email_client.fetch_notifications(config, uid_marks=uid_marks)
+
+    assert "UID 7:*" in mail.searches[0]
+    assert [n.subject for n in notifications] == ["Update 8", "Update 7"]
+    assert uid_marks[email_client.uid_mark_key(config)] == [42, 8]
+
+
+def test_mark_from_another_uidvalidity_is_ignored(serve):
+    config = make_config()
+    mail = serve(FakeIMAP([2, 3], uidvalidity=99))
+    uid_marks = {email_client.uid_mark_key(config): [42, 50]}
+
+    notifications = email_client.fetch_notifications(config, uid_marks=uid_marks)
+
+    assert "UID" not in mail.searches[0]
+    assert len(notifications) == 2
+    assert uid_marks[email_client.uid_mark_key(config)] == [99, 3]
+
+
+def test_nothing_above_mark_leaves_it_unchanged(serve):
+    config = make_config()
+    mail = serve(FakeIMAP([3, 9]))
+    uid_marks = {email_client.uid_mark_key(config): [42, 9]}
+
+    assert email_client.fetch_notifications(config, uid_marks=uid_marks) == []
+    assert mail.fetched == []
+    assert uid_marks[email_client.uid_mark_key(config)] == [42, 9]
+
+
+def test_failed_fetch_does_not_move_mark(serve):
+    config = make_config()
+    serve(FakeIMAP([5, 6, 7], fail_fetch=True))
+    uid_marks = {email_client.uid_mark_key(config): [42, 4]}
+
+    with pytest.raises(imaplib.IMAP4.abort):
+        email_client.fetch_notifications(config, uid_marks=uid_marks)
+
+    assert uid_marks[email_client.uid_mark_key(config)] == [42, 4]
+
+
+def test_filtered_out_messages_still_advance_mark(serve):
+    config = make_config(subject_keywords=["nothing matches this"])
+    serve(FakeIMAP([5, 6]))
+    uid_marks = {}
+
+    assert email_client.fetch_notifications(config, uid_marks=uid_marks) == []
+    assert uid_marks[email_client.uid_mark_key(config)] == [42, 6]
+
+
+def test_server_side_filters_are_opt_in(serve):
+    mail = serve(FakeIMAP([5]))
+
+    email_client.fetch_notifications(make_config(from_filters=["@linkedin.com"]))
+    email_client.fetch_notifications(make_config(from_filters=["@linkedin.com"], server_side_filters=True))
+
+    assert "FROM" not in mail.searches[0]
+    assert mail.searches[1].endswith('(FROM "@linkedin.com")')
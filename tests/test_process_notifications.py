@@ -0,0 +1,65 @@
+"""Tests for the MIME helpers in the process-notifications Lambda."""
+
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("boto3")
+
+
+@pytest.fixture(scope="module")
+def handler():
+    # The handler creates its AWS clients at import; they only need a region, not credentials
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    path = Path(__file__).resolve().parent.parent / "lambda-functions" / "process-notifications" / "handler.py"
+    spec = importlib.util.spec_from_file_location("process_notifications_handler", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# _decode_rfc2047
+
+@pytest.mark.parametrize("value, expected", [
+    ("Plain subject", "Plain subject"),
+    ("=?utf-8?B?SGVsbG8gV29ybGQ=?=", "Hello World"),
+    ("=?UTF-8?b?SGk?=", "Hi"),  # missing base64 padding
+    ("=?iso-8859-1?Q?caf=E9_au_lait?=", "café au lait"),
+    ("Re: =?utf-8?B?w6k=?= done", "Re: é done"),
+    ("=?utf-8?Q?a?= =?utf-8?Q?b?=", "ab"),  # whitespace between encoded-words is dropped
+    ("=?utf-8?Q?a?=\r\n =?utf-8?Q?b?=", "ab"),  # including a folded header line
+    ("=?utf-8?Q?a?= plain", "a plain"),
+])
+def test_decode_rfc2047(handler, value, expected):
+    assert handler._decode_rfc2047(value) == expected
+
+
+def test_decode_rfc2047_leaves_unknown_charset(handler):
+    assert handler._decode_rfc2047("=?x-unknown?B?YQ==?=") == "=?x-unknown?B?YQ==?="
+
+
+def test_decode_rfc2047_replaces_undecodable_bytes(handler):
+    assert handler._decode_rfc2047("=?utf-8?B?/w==?=") == "�"
+
+
+# _group_fetch_literals
+
+def test_group_fetch_literals_follows_continuation_literals(handler):
+    fetch_data = [
+        (b'1 (INTERNALDATE "17-Jul-1996 02:44:25 -0700" BODY[HEADER] {5}', b"hdr-1"),
+        (b" BODY[TEXT]<0> {5}", b"txt-1"),
+        b")",
+        (b"2 (BODY[HEADER] {5}", b"hdr-2"),
+        b")",
+    ]
+
+    assert handler._group_fetch_literals(fetch_data) == {
+        b"1": {"internaldate": b"17-Jul-1996 02:44:25 -0700", "header": b"hdr-1", "text": b"txt-1"},
+        b"2": {"header": b"hdr-2"},
+    }
+
+
+def test_group_fetch_literals_ignores_literal_before_first_message(handler):
+    assert handler._group_fetch_literals([(b" BODY[TEXT] {1}", b"x"), b")"]) == {}